@@ -1,3 +1,40 @@
 from django.contrib import admin
+from .models import Courts, Schedule, Booking, PricingRule
+
 
 # Register your models here.
+@admin.register(Courts)
+class CourtsAdmin(admin.ModelAdmin):
+    list_display = ("court_name", "court_type", "court_surface")
+    list_filter = ("court_type",)
+
+
+@admin.register(Schedule)
+class ScheduleAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "time_slot", "price")
+    list_filter = ("time_slot",)
+    # __str__ usa il nome del campo: lo carica nella stessa query
+    list_select_related = ("court",)
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "booking_date", "email")
+    list_filter = ("booking_date",)
+    search_fields = ("email", "surname")
+    # __str__ usa campo e orario della prenotazione: li carica con un'unica join
+    list_select_related = ("schedule__court",)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Le etichette degli orari nel form mostrano il nome del campo
+        if db_field.name == "schedule":
+            kwargs["queryset"] = Schedule.objects.select_related("court")
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ("name", "court", "sport", "weekdays", "first_slot", "last_slot", "percent", "amount", "priority", "active")
+    list_filter = ("active", "sport")
+    list_editable = ("priority", "active")
+    list_select_related = ("court",)
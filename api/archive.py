@@ -0,0 +1,82 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Booking, BookingArchive
+
+# Separazione tra prenotazioni "calde" (tabella Booking: date recenti e future,
+# lette da disponibilità e vincoli di unicità) e archivio (BookingArchive: date
+# oltre la finestra di conservazione, spostate da "manage.py archive_bookings").
+#
+# Cancellazione e archiviazione avvengono a blocchi, con DELETE set-based su
+# chiave primaria. A differenza di Model.delete() (il collector di Django carica
+# in memoria tutte le prenotazioni di un campo e invia un segnale per ognuna)
+# la memoria resta costante e ogni blocco è una transazione breve. I segnali non partono: cache, inventario e riepiloghi
+# vanno aggiornati dal chiamante (vedi services.delete_court).
+
+# Prenotazioni cancellate o archiviate per transazione
+ARCHIVE_BATCH_SIZE = 5000
+
+# Colonne dell'archivio e relativo lookup sulla prenotazione
+ARCHIVE_COLUMNS = {
+    "booking_id": "booking_id",
+    "court_id": "schedule__court_id",
+    "court_name": "schedule__court__court_name",
+    "court_type": "schedule__court__court_type",
+    "court_image_url": "schedule__court__image_url",
+    "schedule_id": "schedule_id",
+    "time_slot": "schedule__time_slot",
+    "price": "schedule__price",
+    "booking_date": "booking_date",
+    "name": "name",
+    "surname": "surname",
+    "email": "email",
+    "phone": "phone",
+    "booking_datetime": "booking_datetime",
+    "price_charged": "price_charged",
+}
+
+
+# Primo giorno conservato nella tabella delle prenotazioni: le date precedenti
+# possono essere archiviate e non accettano nuove prenotazioni
+def retention_cutoff(today=None):
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=settings.BOOKING_RETENTION_DAYS)
+
+
+def _delete(pks):
+    # DELETE ... WHERE booking_id IN (...) senza passare dal collector
+    queryset = Booking.objects.filter(pk__in=pks)
+    return queryset._raw_delete(queryset.db)
+
+
+# Cancella le prenotazioni del queryset. Restituisce il numero di righe cancellate.
+def delete_bookings(queryset, batch_size=ARCHIVE_BATCH_SIZE):
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.order_by().values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            deleted += _delete(pks)
+
+
+# Sposta le prenotazioni del queryset nell'archivio (copia e cancellazione nella
+# stessa transazione). Restituisce il numero di righe archiviate.
+def archive_bookings(queryset, batch_size=ARCHIVE_BATCH_SIZE):
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.order_by().values(*ARCHIVE_COLUMNS.values())[:batch_size])
+            if not rows:
+                return archived
+            # Una prenotazione già archiviata (es: blocco ripetuto) non viene duplicata
+            BookingArchive.objects.bulk_create(
+                [
+                    BookingArchive(**{column: row[lookup] for column, lookup in ARCHIVE_COLUMNS.items()})
+                    for row in rows
+                ],
+                ignore_conflicts=True,
+            )
+            archived += _delete([row["booking_id"] for row in rows])
@@ -0,0 +1,202 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import NotFound, Throttled
+
+from . import pricing, pubsub, services
+from .availability import available_schedules
+from .models import Schedule
+from .pagination import BookingKeysetPagination
+from .queries import INVALID_DATE_MESSAGE, filter_bookings, filter_courts, parse_court_id, select_fields
+from .renderers import ColumnarJSONRenderer, FastJSONRenderer
+from .throttling import BookingRateThrottle, LoadSheddingThrottle, Overloaded
+from .utils import parse_query_date
+from .views import courts_values, schedules_values, bookings_values
+
+# View asincrone per gli endpoint pubblici, servite da campoclick_be/asgi.py.
+# Usano l'ORM asincrono di Django: mentre una richiesta attende PostgreSQL il
+# worker resta libero di servirne altre. Le risposte hanno gli stessi byte
+# delle view sincrone corrispondenti in views.py.
+
+
+def _json(data, status=200, headers=None, request=None):
+    # Come nelle view DRF, ?format=columnar restituisce le liste in formato colonnare
+    renderer = FastJSONRenderer()
+    if request is not None and request.GET.get("format") == ColumnarJSONRenderer.format:
+        renderer = ColumnarJSONRenderer()
+    return HttpResponse(
+        renderer.render(data),
+        status=status,
+        headers=headers,
+        content_type=renderer.media_type,
+    )
+
+
+def _bad_request(message):
+    return _json({"error": message}, status=400)
+
+
+async def _rows(values_serializer, queryset):
+    return [values_serializer.to_representation(row) async for row in values_serializer.values(queryset)]
+
+
+# ********** CAMPI SPORTIVI **********
+
+
+@require_GET
+async def get_courts(request):
+    selected, error = select_fields(courts_values, request.GET)
+    if error:
+        return _bad_request(error)
+    return _json(await _rows(selected, filter_courts(request.GET.get("sport", None))), request=request)
+
+
+# ********** ORARI **********
+
+
+@require_GET
+async def get_schedules(request):
+    court_id, error = parse_court_id(request.GET)
+    if error:
+        return _bad_request(error)
+    selected, error = select_fields(schedules_values, request.GET)
+    if error:
+        return _bad_request(error)
+    sport = request.GET.get("sport", None)
+    date = request.GET.get("date", None)
+
+    if date:
+        booking_date = parse_query_date(date)
+        if booking_date is None:
+            return _bad_request(INVALID_DATE_MESSAGE)
+        # Con l'inventario attivo available_schedules legge l'orizzonte dal database
+        schedules = await sync_to_async(available_schedules)(booking_date, court_id=court_id, sport=sport)
+    else:
+        schedules = Schedule.objects.all()
+        if court_id is not None:
+            schedules = schedules.filter(court_id=court_id)
+        if sport:
+            schedules = schedules.filter(court__court_type__iexact=sport)
+
+    schedules = schedules.order_by("court_id", "time_slot")
+    if not date:
+        return _json(await _rows(selected, schedules), request=request)
+
+    # Come in views.get_schedules ogni orario riporta il prezzo effettivo della data
+    rows = [row async for row in selected.values(schedules, extra=("schedule_id", "court", "price"))]
+    prices = await sync_to_async(pricing.price_tables)(booking_date, sorted({row["court"] for row in rows}))
+    data = []
+    for row in rows:
+        item = selected.to_representation(row)
+        base = pricing.format_price(row["price"])
+        item["effective_price"] = prices[row["court"]].get(row["schedule_id"], base)
+        data.append(item)
+    return _json(data, request=request)
+
+
+# Aggiornamenti in tempo reale degli slot di un campo in una data (Server-Sent
+# Events): al posto del polling di get_schedules?date= il client riceve subito
+# gli orari liberi ("snapshot") e poi un evento per ogni slot occupato o
+# liberato. Un client collegato costa una connessione aperta, non una query.
+@require_GET
+async def live_availability(request):
+    if not pubsub.live_updates_enabled():
+        return _json({"detail": "Aggiornamenti in tempo reale non attivi."}, status=404)
+    # Con WSGI lo stream terrebbe occupato un worker per tutta la durata della connessione
+    if not isinstance(request, ASGIRequest):
+        return _json({"detail": "Disponibile solo con il server ASGI."}, status=501)
+
+    court_id, error = parse_court_id(request.GET)
+    if error:
+        return _bad_request(error)
+    booking_date = parse_query_date(request.GET.get("date", ""))
+    if court_id is None or booking_date is None:
+        return _bad_request("Parametri court_id e date (YYYY-MM-DD) obbligatori.")
+
+    # L'iscrizione precede la lettura: gli eventi arrivati nel frattempo seguono lo snapshot
+    subscription = pubsub.get_broker().subscribe(pubsub.slot_channel(court_id, booking_date))
+    try:
+        # available_schedules può leggere l'orizzonte dell'inventario dal database
+        schedules = await sync_to_async(available_schedules)(booking_date, court_id=court_id)
+        free = [slot async for slot in schedules.order_by("time_slot").values_list("time_slot", flat=True)]
+    except BaseException:
+        subscription.close()
+        raise
+
+    snapshot = {"court_id": court_id, "date": booking_date.isoformat(), "available": free}
+    stream = pubsub.EventStream(subscription, [("snapshot", snapshot)], heartbeat=settings.LIVE_HEARTBEAT)
+    # Nessun buffering da parte di proxy (X-Accel-Buffering per nginx) e nessuna cache
+    return StreamingHttpResponse(
+        stream,
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ********** PRENOTAZIONI **********
+
+
+@require_GET
+async def get_bookings(request):
+    bookings, error = filter_bookings(request.GET)
+    if error:
+        return _bad_request(error)
+    selected, error = select_fields(bookings_values, request.GET)
+    if error:
+        return _bad_request(error)
+
+    paginator = BookingKeysetPagination()
+    try:
+        page = await paginator.apaginate_queryset(
+            selected.values(bookings, extra=paginator.ordering), request
+        )
+    except NotFound as e:
+        return _json({"detail": str(e.detail)}, status=404)
+    return _json(
+        {
+            "next": paginator.get_next_link(),
+            "results": [selected.to_representation(row) for row in page],
+        },
+        request=request,
+    )
+
+
+# Stessi controlli di carico e limiti per IP/email di create_booking in views.py
+def _throttle(request, data):
+    try:
+        LoadSheddingThrottle().allow_request(request, None)
+    except Overloaded as e:
+        return _json({"detail": str(e.detail)}, status=503, headers={"Retry-After": str(e.wait)})
+
+    throttle = BookingRateThrottle()
+    wait = throttle.check(throttle.get_ident(request), data.get("email") if isinstance(data, dict) else None)
+    if wait:
+        e = Throttled(wait)
+        return _json({"detail": str(e.detail)}, status=429, headers={"Retry-After": str(e.wait)})
+    return None
+
+
+# Come create_booking in views.py è accessibile anche senza autenticazione
+@csrf_exempt
+@require_POST
+async def create_booking(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return _bad_request("Corpo della richiesta non valido (JSON atteso).")
+    throttled = _throttle(request, data)
+    if throttled:
+        return throttled
+
+    # Il servizio è transazionale (lock di riga): viene eseguito nel thread
+    # dedicato alla richiesta, come fa l'ORM asincrono
+    result = await sync_to_async(services.create_booking)(
+        data, idempotency_key=request.headers.get("Idempotency-Key")
+    )
+    headers = {"Idempotent-Replayed": "true"} if result.replayed else None
+    return _json(result.data, status=result.status, headers=headers)
@@ -0,0 +1,107 @@
+from django.db.models import Case, Exists, IntegerField, OuterRef, Sum, Value, When
+from . import inventory
+from .models import Schedule, Booking, SlotInventory
+
+# Motore di disponibilità: calcola gli slot liberi con una sola query
+# (NOT EXISTS sulle prenotazioni) invece di interrogare ogni schedule.
+# Con l'inventario attivo (inventory.py) le date dell'orizzonte vengono lette
+# direttamente dalle righe precalcolate.
+
+
+# Orari gestiti (9-18): il bit i delle maschere corrisponde a SLOTS[i]
+SLOTS = [hour for hour, _ in Schedule.HOUR_CHOICES]
+
+# Ampiezza massima dell'intervallo richiesto alla matrice di disponibilità
+MAX_MATRIX_DAYS = 62
+
+
+# Restituisce le schedules libere per la data indicata, filtrabili per campo e sport
+def available_schedules(date, court_id=None, sport=None):
+    if inventory.covers(date):
+        schedules = Schedule.objects.filter(inventory__date=date, inventory__is_booked=False)
+    else:
+        bookings = Booking.objects.filter(schedule=OuterRef("pk"), booking_date=date)
+        schedules = Schedule.objects.filter(~Exists(bookings))
+
+    if court_id:
+        schedules = schedules.filter(court_id=court_id)
+    if sport:
+        schedules = schedules.filter(court__court_type__iexact=sport)
+
+    return schedules
+
+
+# Verifica se uno slot è libero per la data indicata, ignorando eventualmente
+# una prenotazione (utile quando si modifica una prenotazione esistente)
+def is_slot_available(schedule_id, date, exclude_booking=None):
+    if exclude_booking is None and inventory.covers(date):
+        return not SlotInventory.objects.filter(
+            schedule_id=schedule_id, date=date, is_booked=True
+        ).exists()
+    bookings = Booking.objects.filter(schedule_id=schedule_id, booking_date=date)
+    if exclude_booking is not None:
+        bookings = bookings.exclude(pk=exclude_booking)
+    return not bookings.exists()
+
+
+# Restituisce gli slot già prenotati tra le coppie (schedule_id, data) indicate,
+# con una sola query (usata per validare le prenotazioni multiple)
+def booked_slots(pairs):
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    schedule_ids = {schedule_id for schedule_id, _ in pairs}
+    dates = {date for _, date in pairs}
+    if inventory.covers(*dates):
+        booked = SlotInventory.objects.filter(
+            schedule_id__in=schedule_ids, date__in=dates, is_booked=True
+        ).values_list("schedule_id", "date")
+    else:
+        booked = Booking.objects.filter(
+            schedule_id__in=schedule_ids, booking_date__in=dates
+        ).values_list("schedule_id", "booking_date")
+    return pairs & set(booked)
+
+
+# Somma i bit degli orari presenti nel gruppo (ogni orario compare al massimo
+# una volta per campo e data grazie ai vincoli unique_together)
+def _slot_mask(field):
+    bits = [When(**{field: hour}, then=Value(1 << i)) for i, hour in enumerate(SLOTS)]
+    return Sum(Case(*bits, default=Value(0), output_field=IntegerField()))
+
+
+# Calcola la matrice campo x data x orario tra start ed end (inclusi).
+# Restituisce {court_id: [maschera_giorno_1, maschera_giorno_2, ...]} dove ogni
+# maschera ha a 1 i bit degli orari ancora liberi.
+def availability_matrix(start, end, court_id=None, sport=None, court_ids=None):
+    schedules = Schedule.objects.all()
+    # Gli slot occupati arrivano dall'inventario se copre tutto l'intervallo
+    if inventory.covers(start, end):
+        booked, date_field = SlotInventory.objects.filter(date__range=(start, end), is_booked=True), "date"
+    else:
+        booked, date_field = Booking.objects.filter(booking_date__range=(start, end)), "booking_date"
+
+    if court_ids is not None:
+        schedules = schedules.filter(court_id__in=court_ids)
+        booked = booked.filter(schedule__court_id__in=court_ids)
+    if court_id:
+        schedules = schedules.filter(court_id=court_id)
+        booked = booked.filter(schedule__court_id=court_id)
+    if sport:
+        schedules = schedules.filter(court__court_type__iexact=sport)
+        booked = booked.filter(schedule__court__court_type__iexact=sport)
+
+    # Orari esistenti per ogni campo
+    court_masks = schedules.values("court_id").annotate(mask=_slot_mask("time_slot"))
+    # Orari prenotati per ogni campo e giorno, in un'unica query raggruppata
+    booked_masks = booked.values("schedule__court_id", date_field).annotate(
+        mask=_slot_mask("schedule__time_slot")
+    )
+
+    days = (end - start).days + 1
+    matrix = {row["court_id"]: [row["mask"]] * days for row in court_masks}
+    for row in booked_masks:
+        day = (row[date_field] - start).days
+        matrix[row["schedule__court_id"]][day] &= ~row["mask"]
+
+    return matrix
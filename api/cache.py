@@ -0,0 +1,161 @@
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Cache versionata per disponibilità e campi sportivi.
+# Ogni "scope" (es: "courts" o "court:<id>") ha un contatore di versione che
+# entra nella chiave dei dati: quando un campo, un orario o una prenotazione
+# cambiano si incrementa il contatore e le vecchie chiavi non vengono più lette
+# (verranno espulse dalla politica LRU del backend).
+
+PREFIX = "campoclick"
+
+
+# I dati vanno in cache solo se il backend è condiviso tra i processi
+# (settings.SHARED_CACHE): altrimenti ogni lettura li ricalcola
+def shared_cache_enabled():
+    return getattr(settings, "SHARED_CACHE", False)
+
+
+def court_scope(court_id):
+    return f"court:{court_id}"
+
+
+def _version_key(scope):
+    return f"{PREFIX}:version:{scope}"
+
+
+def _initial_version():
+    # Valore dipendente dal tempo: se un contatore viene espulso dalla cache
+    # la nuova versione non coincide con una già usata in precedenza
+    return time.time_ns()
+
+
+# Restituisce le versioni correnti degli scope indicati (una sola lettura in cache)
+def get_versions(scopes):
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+
+    versions = {}
+    for scope, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = _initial_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions[scope] = version
+    return versions
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+# Invalida gli scope indicati. L'incremento viene ripetuto dopo il commit:
+# così una lettura concorrente che ha ripopolato la cache con i dati precedenti
+# al commit non resta visibile.
+def bump_versions(*scopes):
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def invalidate_courts(*court_ids, listing=False):
+    scopes = [court_scope(court_id) for court_id in set(court_ids) if court_id is not None]
+    if listing:
+        scopes.append("courts")
+    bump_versions(*scopes)
+
+
+# ********** TIMESTAMP DI MODIFICA PER TABELLA **********
+# Ogni tabella ("courts", "schedules", "bookings") ha l'istante dell'ultima
+# scrittura (in nanosecondi), usato per gli ETag senza serializzare nulla.
+
+
+def _stamp_key(table):
+    return f"{PREFIX}:stamp:{table}"
+
+
+def _touch(tables):
+    now = time.time_ns()
+    cache.set_many({_stamp_key(table): now for table in tables}, timeout=None)
+
+
+def touch_tables(*tables):
+    _touch(tables)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _touch(tables))
+
+
+# Restituisce l'ultima modifica delle tabelle indicate; se un valore manca
+# (cache fredda o chiave espulsa) si usa l'istante corrente
+def table_stamps(tables):
+    keys = {table: _stamp_key(table) for table in tables}
+    found = cache.get_many(keys.values())
+
+    stamps = {}
+    for table, key in keys.items():
+        stamp = found.get(key)
+        if stamp is None:
+            stamp = time.time_ns()
+            if not cache.add(key, stamp, timeout=None):
+                stamp = cache.get(key, stamp)
+        stamps[table] = stamp
+    return stamps
+
+
+def _data_key(name, version, parts):
+    # quote() evita spazi e caratteri non ammessi da alcuni backend (es: memcached)
+    return ":".join([PREFIX, name, str(version)] + [quote(str(part)) for part in parts])
+
+
+# Legge un valore dipendente da un solo scope, calcolandolo se assente
+def get_or_compute(name, scope, parts, compute):
+    if not shared_cache_enabled():
+        return compute()
+    version = get_versions([scope])[scope]
+    key = _data_key(name, version, parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+# Legge un valore per ogni campo (chiave campo + parti, es: la data).
+# compute(court_ids) riceve solo i campi mancanti e restituisce un dizionario
+# court_id -> valore; tutti i mancanti vengono calcolati con una sola chiamata.
+def get_or_compute_per_court(name, court_ids, parts, compute, default=None):
+    if not shared_cache_enabled():
+        computed = compute(list(court_ids))
+        return {court_id: computed.get(court_id, default) for court_id in court_ids}
+    versions = get_versions([court_scope(court_id) for court_id in court_ids])
+    keys = {
+        court_id: _data_key(name, versions[court_scope(court_id)], [court_id] + list(parts))
+        for court_id in court_ids
+    }
+    found = cache.get_many(keys.values())
+
+    result = {}
+    missing = []
+    for court_id, key in keys.items():
+        if key in found:
+            result[court_id] = found[key]
+        else:
+            missing.append(court_id)
+
+    if missing:
+        computed = compute(missing)
+        values = {court_id: computed.get(court_id, default) for court_id in missing}
+        cache.set_many({keys[court_id]: value for court_id, value in values.items()})
+        result.update(values)
+
+    return result
@@ -0,0 +1,46 @@
+import hashlib
+from functools import wraps
+
+from django.views.decorators.http import condition
+
+from .cache import shared_cache_enabled, table_stamps
+
+# GET condizionali (ETag) calcolati dai timestamp di modifica delle tabelle: se
+# il client ha già la versione corrente riceve un 304 senza che la view (query
+# e serializzazione) venga eseguita.
+#
+# Niente Last-Modified: Django lo tronca al secondo, quindi una scrittura nello
+# stesso secondo della risposta precedente risponderebbe ancora 304. I timestamp
+# sono in cache: con un backend locale al processo (settings.SHARED_CACHE falso)
+# un worker non vedrebbe le scritture degli altri, e le richieste passano
+# direttamente alla view.
+
+
+def _stamps(request, tables):
+    names = tables(request) if callable(tables) else tables
+    return table_stamps(names)
+
+
+# tables: nomi delle tabelle da cui dipende la risposta, oppure una funzione
+# che li calcola a partire dalla richiesta
+def table_condition(tables):
+    def etag(request, *args, **kwargs):
+        stamps = _stamps(request, tables)
+        # La rappresentazione dipende anche da URL (filtri, pk) e formato richiesto
+        parts = [f"{table}={stamp}" for table, stamp in sorted(stamps.items())]
+        parts += [request.get_full_path(), request.headers.get("Accept", "")]
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        # Solo le letture sono condizionali: PUT e DELETE con If-Match non ricevono 412
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in ("GET", "HEAD") and shared_cache_enabled():
+                return conditional_view(request, *args, **kwargs)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
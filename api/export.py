@@ -0,0 +1,52 @@
+import csv
+import io
+from itertools import islice
+
+from .renderers import FastJSONRenderer
+
+# Export in streaming delle prenotazioni (CSV o NDJSON). Le righe vengono lette
+# con .iterator(): su PostgreSQL è un cursore lato server che scarica
+# EXPORT_CHUNK_SIZE righe alla volta, quindi la memoria resta costante qualunque
+# sia il numero di prenotazioni. Con DISABLE_SERVER_SIDE_CURSORS (pooler in
+# modalità transazione) il driver riceve invece l'intero risultato.
+# Ogni riga ha gli stessi campi e valori dell'elenco /api/bookings/.
+
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _chunks(values_serializer, queryset):
+    queryset = queryset.order_by("booking_date", "booking_datetime", "booking_id")
+    rows = values_serializer.values(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while chunk := list(islice(rows, EXPORT_CHUNK_SIZE)):
+        yield [values_serializer.to_representation(row) for row in chunk]
+
+
+def stream_csv(values_serializer, queryset):
+    names = [name for name, _, _ in values_serializer.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for chunk in _chunks(values_serializer, queryset):
+        writer.writerows([data[name] for name in names] for data in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Intestazione sola se non ci sono righe
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(values_serializer, queryset):
+    renderer = FastJSONRenderer()
+    for chunk in _chunks(values_serializer, queryset):
+        yield b"".join(renderer.render(data) + b"\n" for data in chunk)
+
+
+def stream_bookings(export_format, values_serializer, queryset):
+    stream = stream_csv if export_format == "csv" else stream_ndjson
+    return stream(values_serializer, queryset)
@@ -0,0 +1,80 @@
+import copy
+
+from rest_framework import serializers
+
+# Percorso di lettura veloce per le liste: invece di istanziare un modello per
+# riga e attraversare i campi del ModelSerializer, legge le colonne con
+# .values() e applica solo la conversione di ogni campo del serializer.
+# L'output ha la stessa forma (stesse chiavi, stesso ordine, stessi valori)
+# del serializer da cui viene costruito.
+
+
+# Con expand={"nome": serializer_class} i campi di altri serializer possono
+# essere aggiunti su richiesta (?expand=nome); select() restringe le colonne
+# e quindi anche la SELECT generata da .values().
+class ValuesSerializer:
+    def __init__(self, serializer_class, expand=None):
+        self.columns = self._columns(serializer_class)
+        self.expansions = {name: self._columns(extra) for name, extra in (expand or {}).items()}
+
+    @staticmethod
+    def _columns(serializer_class):
+        columns = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            # "schedule.court.court_name" -> "schedule__court__court_name"
+            lookup = "__".join(field.source_attrs)
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                # .values() restituisce già la chiave primaria della relazione
+                convert = None
+            else:
+                convert = field.to_representation
+            columns.append((name, lookup, convert))
+        return columns
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.columns]
+
+    @property
+    def lookups(self):
+        return [lookup for _, lookup, _ in self.columns]
+
+    # Copia con le sole colonne richieste (nell'ordine del serializer) più quelle
+    # delle espansioni. Solleva ValueError con il nome sconosciuto.
+    def select(self, fields=None, expand=()):
+        columns = list(self.columns)
+        for name in expand:
+            if name not in self.expansions:
+                raise ValueError(name)
+            columns += self.expansions[name]
+        if fields:
+            unknown = set(fields) - {name for name, _, _ in columns}
+            if unknown:
+                raise ValueError(sorted(unknown)[0])
+            columns = [column for column in columns if column[0] in fields]
+
+        selected = copy.copy(self)
+        selected.columns = columns
+        selected.expansions = {}
+        return selected
+
+    # Riduce una riga già serializzata (es: letta dalla cache) alle colonne selezionate
+    def project(self, data):
+        return {name: data[name] for name, _, _ in self.columns}
+
+    # Righe grezze (chiavi = lookup ORM), utili per la paginazione a cursore;
+    # extra aggiunge colonne lette ma non serializzate (es: la posizione del cursore)
+    def values(self, queryset, extra=()):
+        return queryset.values(*dict.fromkeys([*self.lookups, *extra]))
+
+    def to_representation(self, row):
+        data = {}
+        for name, lookup, convert in self.columns:
+            value = row[lookup]
+            data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+    def rows(self, queryset):
+        return [self.to_representation(row) for row in self.values(queryset)]
@@ -0,0 +1,103 @@
+import datetime
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, Max, Min, OuterRef, Q
+
+from .models import Schedule, Booking, SlotInventory
+
+# Inventario precalcolato degli slot: una riga (schedule, data, is_booked) per
+# ogni giorno dell'orizzonte. Con SLOT_INVENTORY attivo le letture di
+# disponibilità diventano range scan sull'indice e la prenotazione un UPDATE
+# condizionale atomico, senza sottoquery EXISTS sulle prenotazioni.
+# Le date fuori dall'orizzonte continuano a usare le query sulle prenotazioni.
+
+HORIZON_KEY = "campoclick:inventory:horizon"
+
+
+def inventory_enabled():
+    return getattr(settings, "SLOT_INVENTORY", False)
+
+
+def _bounds():
+    bounds = SlotInventory.objects.aggregate(first=Min("date"), last=Max("date"))
+    return bounds["first"], bounds["last"]
+
+
+# Intervallo di date coperto dall'inventario come (prima, ultima), oppure None.
+# È in cache con la scadenza predefinita: un'estensione eseguita da un altro
+# processo diventa visibile al più tardi alla scadenza.
+def horizon():
+    value = cache.get(HORIZON_KEY)
+    if value is None:
+        value = _bounds()
+        cache.set(HORIZON_KEY, value)
+    return value if value[0] is not None else None
+
+
+# Indica se le date richieste possono essere lette dall'inventario
+def covers(*dates):
+    if not inventory_enabled():
+        return False
+    bounds = horizon()
+    return bounds is not None and all(bounds[0] <= date <= bounds[1] for date in dates)
+
+
+def _booked(field="date"):
+    return Exists(Booking.objects.filter(schedule_id=OuterRef("schedule_id"), booking_date=OuterRef(field)))
+
+
+# Porta l'orizzonte a [today, today + days): crea le righe mancanti, le allinea
+# alle prenotazioni esistenti ed elimina i giorni passati.
+# Restituisce il numero di righe create.
+def extend(days, today=None):
+    start = today or datetime.date.today()
+    dates = [start + datetime.timedelta(days=offset) for offset in range(days)]
+    schedule_ids = list(Schedule.objects.values_list("pk", flat=True))
+
+    before = SlotInventory.objects.filter(date__range=(dates[0], dates[-1])).count()
+    SlotInventory.objects.bulk_create(
+        [SlotInventory(schedule_id=pk, date=date) for date in dates for pk in schedule_ids],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+    SlotInventory.objects.filter(date__range=(dates[0], dates[-1])).update(is_booked=_booked())
+    SlotInventory.objects.filter(date__lt=start).delete()
+    cache.delete(HORIZON_KEY)
+
+    return SlotInventory.objects.filter(date__range=(dates[0], dates[-1])).count() - before
+
+
+# Crea le righe dei nuovi orari per tutto l'orizzonte corrente
+def add_schedules(schedules):
+    first, last = _bounds()
+    if first is None:
+        return
+    dates = [first + datetime.timedelta(days=offset) for offset in range((last - first).days + 1)]
+    SlotInventory.objects.bulk_create(
+        [SlotInventory(schedule=schedule, date=date) for schedule in schedules for date in dates],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+
+
+# Occupa lo slot con un UPDATE condizionale: la riga viene bloccata e solo una
+# transazione concorrente può passare da libero a occupato.
+# Restituisce True se lo slot è stato occupato, False se era già occupato e
+# None se la riga non esiste (data fuori orizzonte).
+def reserve(schedule_id, date):
+    slot = SlotInventory.objects.filter(schedule_id=schedule_id, date=date)
+    if slot.filter(is_booked=False).update(is_booked=True):
+        return True
+    return False if slot.exists() else None
+
+
+# Riallinea is_booked alle prenotazioni per le coppie (schedule_id, data) indicate
+def sync_slots(pairs):
+    pairs = {(schedule_id, date) for schedule_id, date in pairs if schedule_id and date}
+    if not pairs:
+        return
+    slots = reduce(or_, (Q(schedule_id=schedule_id, date=date) for schedule_id, date in pairs))
+    SlotInventory.objects.filter(slots).update(is_booked=_booked())
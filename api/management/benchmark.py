@@ -0,0 +1,32 @@
+import time
+from wsgiref.util import setup_testing_defaults
+
+# Funzioni condivise dai comandi di benchmark
+
+
+# Esegue una GET direttamente sull'applicazione WSGI (con i segnali di inizio e
+# fine richiesta, a differenza del client di test) e restituisce (secondi, status)
+def wsgi_get(application, path, query_string=""):
+    environ = {
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "HTTP_HOST": "127.0.0.1",
+        "SERVER_NAME": "127.0.0.1",
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    started = time.perf_counter()
+    response = application(environ, lambda status, headers: statuses.append(status))
+    try:
+        b"".join(response)
+    finally:
+        response.close()
+    return time.perf_counter() - started, int(statuses[0].split()[0])
+
+
+# Percentile (0-100) di una lista già ordinata
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
@@ -0,0 +1,35 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import ARCHIVE_BATCH_SIZE, archive_bookings
+from api.cache import invalidate_courts, touch_tables
+from api.models import Booking
+
+
+# Da eseguire ogni giorno (es: cron): sposta nell'archivio le prenotazioni più
+# vecchie della finestra di conservazione, così la tabella delle prenotazioni
+# (disponibilità, vincoli di unicità, elenchi) contiene solo le date recenti
+class Command(BaseCommand):
+    help = "Archivia le prenotazioni oltre la finestra di conservazione"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.BOOKING_RETENTION_DAYS)
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        # Le date più recenti accettano ancora prenotazioni: non possono essere archiviate
+        if options["days"] < settings.BOOKING_RETENTION_DAYS:
+            raise CommandError(f"--days deve essere almeno {settings.BOOKING_RETENTION_DAYS}.")
+
+        cutoff = datetime.date.today() - datetime.timedelta(days=options["days"])
+        bookings = Booking.objects.filter(booking_date__lt=cutoff)
+        court_ids = set(bookings.values_list("schedule__court_id", flat=True).distinct())
+        archived = archive_bookings(bookings, batch_size=options["batch_size"])
+
+        # Le righe spostate non inviano segnali: la disponibilità in cache di quei giorni va invalidata
+        if archived:
+            invalidate_courts(*court_ids)
+            touch_tables("bookings")
+        self.stdout.write(f"Prenotazioni archiviate: {archived} (precedenti al {cutoff.isoformat()})")
@@ -0,0 +1,223 @@
+import datetime
+import json
+import statistics
+import time
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api import urls
+from api.management.benchmark import percentile
+from api.models import Courts, Schedule, Booking
+
+
+class Rollback(Exception):
+    pass
+
+
+# Esegue ogni URL di api/urls.py con il client di test e riporta latenza
+# (p50/p95/p99) e numero di query. Le richieste di scrittura vengono annullate
+# una per una (savepoint) e tutto il resto alla fine: il database non cambia.
+# Richiede dati esistenti (vedi seed_data). I risultati possono essere salvati
+# in JSON (--output) e confrontati con un'esecuzione precedente (--compare).
+class Command(BaseCommand):
+    help = "Benchmark end-to-end di tutti gli endpoint dell'API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Richieste misurate per URL")
+        parser.add_argument("--output", help="File JSON in cui salvare i risultati")
+        parser.add_argument("--compare", help="File JSON di un'esecuzione precedente")
+        parser.add_argument("--only", nargs="+", help="Nomi degli URL da eseguire")
+
+    def handle(self, *args, **options):
+        court = Courts.objects.order_by("pk").first()
+        booking = Booking.objects.order_by("booking_date", "pk").first()
+        if court is None or booking is None:
+            raise CommandError("Database vuoto: eseguire prima seed_data.")
+
+        results = {}
+        try:
+            # Le richieste ripetute non devono finire nei limiti di create_booking
+            with override_settings(BOOKING_RATE_LIMITS={}), transaction.atomic():
+                plans = self.plans(court, booking)
+                missing = [pattern.name for pattern in urls.urlpatterns if pattern.name not in plans]
+                if missing:
+                    raise CommandError(f"URL senza piano di benchmark: {', '.join(missing)}")
+
+                client = APIClient(SERVER_NAME="127.0.0.1")
+                client.force_authenticate(User.objects.create_user("bench-api"))
+                for pattern in urls.urlpatterns:
+                    if options["only"] and pattern.name not in options["only"]:
+                        continue
+                    results[pattern.name] = self.measure(client, plans[pattern.name], options["requests"])
+                raise Rollback
+        except Rollback:
+            pass
+
+        previous = {}
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                previous = json.load(f)["results"]
+        self.report(results, previous)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(
+                    {
+                        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                        "settings": settings.SETTINGS_MODULE,
+                        "database": connection.vendor,
+                        "requests": options["requests"],
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                )
+
+    # (metodo, URL, corpo JSON) di ogni URL. Le scritture usano un campo creato
+    # apposta, così gli slot prenotati sono sempre liberi. "STREAM" misura il
+    # tempo fino al primo evento di uno stream SSE (che non termina mai).
+    def plans(self, court, booking):
+        bench_court = Courts.objects.create(court_name="Benchmark", court_type="tennis", court_surface="terra")
+        empty_court = Courts.objects.create(court_name="Benchmark vuoto", court_type="tennis", court_surface="terra")
+        slots = Schedule.objects.bulk_create(
+            [
+                Schedule(court=bench_court, time_slot=hour, price=Decimal("20.00"))
+                for hour, _ in Schedule.HOUR_CHOICES
+            ]
+        )
+        date = booking.booking_date
+        end = date + datetime.timedelta(days=6)
+        future = date + datetime.timedelta(days=3650)
+
+        def booking_payload(schedule):
+            return {
+                "schedule": schedule.pk,
+                "booking_date": future.isoformat(),
+                "name": "Mario",
+                "surname": "Rossi",
+                "email": "bench@example.com",
+                "phone": "3331234567",
+            }
+
+        def schedule_payload(hour):
+            return {"court": empty_court.pk, "time_slot": hour, "price": "20.00"}
+
+        return {
+            "get_courts": ("GET", reverse("get_courts"), None),
+            "create_court": (
+                "POST",
+                reverse("create_court"),
+                {"court_name": "Nuovo", "court_type": "padel", "court_surface": "erba sintetica"},
+            ),
+            "court_detail": ("GET", reverse("court_detail", args=[court.pk]), None),
+            "get_schedules": ("GET", f"{reverse('get_schedules')}?date={date.isoformat()}", None),
+            "create_schedule": ("POST", reverse("create_schedule"), schedule_payload(9)),
+            "create_schedules_bulk": (
+                "POST",
+                reverse("create_schedules_bulk"),
+                [schedule_payload(hour) for hour, _ in Schedule.HOUR_CHOICES],
+            ),
+            "get_availability": (
+                "GET",
+                f"{reverse('get_availability')}?start={date.isoformat()}&end={end.isoformat()}",
+                None,
+            ),
+            "schedule_detail": ("GET", reverse("schedule_detail", args=[slots[0].pk]), None),
+            "get_bookings": ("GET", reverse("get_bookings"), None),
+            "create_booking": ("POST", reverse("create_booking"), booking_payload(slots[0])),
+            "create_bookings_bulk": (
+                "POST",
+                reverse("create_bookings_bulk"),
+                [booking_payload(schedule) for schedule in slots],
+            ),
+            "export_bookings": ("GET", reverse("export_bookings", args=["ndjson"]), None),
+            "booking_detail": ("GET", reverse("booking_detail", args=[booking.pk]), None),
+            "async_get_courts": ("GET", reverse("async_get_courts"), None),
+            "async_get_schedules": ("GET", f"{reverse('async_get_schedules')}?date={date.isoformat()}", None),
+            "async_get_bookings": ("GET", reverse("async_get_bookings"), None),
+            "async_create_booking": ("POST", reverse("async_create_booking"), booking_payload(slots[0])),
+            "live_availability": (
+                "STREAM",
+                f"{reverse('live_availability')}?court_id={court.pk}&date={date.isoformat()}",
+                None,
+            ),
+            "get_occupancy_report": (
+                "GET",
+                f"{reverse('get_occupancy_report')}?start={date.isoformat()}&end={end.isoformat()}&group=week",
+                None,
+            ),
+            "metrics": ("METRICS", reverse("metrics"), None),
+        }
+
+    def request(self, client, method, url, payload):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if method == "GET":
+                response = client.get(url)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            elif method == "STREAM":
+                response = async_to_sync(self.first_event)(url)
+            elif method == "METRICS":
+                response = self.read_metrics(client, url)
+            else:
+                with transaction.atomic():
+                    response = client.post(url, payload, format="json")
+                    transaction.set_rollback(True)
+            elapsed = time.perf_counter() - started
+        return elapsed, response.status_code, len(queries)
+
+    # Lo stream SSE richiede una richiesta ASGI (e LIVE_UPDATES attivo solo per
+    # questa richiesta, così le scritture restano misurate con le impostazioni
+    # correnti): legge il primo evento e chiude
+    async def first_event(self, url):
+        with override_settings(LIVE_UPDATES=True):
+            response = await AsyncClient(SERVER_NAME="127.0.0.1").get(url)
+        if response.streaming:
+            stream = response.streaming_content
+            await anext(stream)
+            await stream.aclose()
+        return response
+
+    # Le metriche sono esposte solo con un token: se non è configurato se ne usa
+    # uno valido solo per questa richiesta
+    def read_metrics(self, client, url):
+        token = settings.PERF_METRICS_TOKEN or "bench"
+        with override_settings(PERF_METRICS_TOKEN=token):
+            return client.get(url, headers={"Authorization": f"Bearer {token}"})
+
+    def measure(self, client, plan, requests):
+        method, url, payload = plan
+        self.request(client, method, url, payload)  # riscaldamento (cache, connessione)
+        samples = [self.request(client, method, url, payload) for _ in range(requests)]
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        return {
+            "method": method,
+            "url": url,
+            "status": samples[-1][1],
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "queries": statistics.median(queries for _, _, queries in samples),
+        }
+
+    def report(self, results, previous):
+        self.stdout.write(
+            f"{'url':24} {'status':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'query':>6} {'p50 prec.':>10}"
+        )
+        for name, result in results.items():
+            before = previous.get(name, {}).get("p50_ms")
+            self.stdout.write(
+                f"{name:24} {result['status']:>6} {result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                f"{result['p99_ms']:>7.2f}ms {result['queries']:>6g} "
+                + (f"{before:>8.2f}ms" if before is not None else f"{'-':>10}")
+            )
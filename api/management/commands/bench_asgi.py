@@ -0,0 +1,123 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from api.management.benchmark import percentile, wsgi_get
+
+
+# Confronta il throughput dello stesso endpoint servito via WSGI (pool di thread
+# di dimensione fissa, come i worker di un server WSGI) e via ASGI (view
+# asincrone con richieste concorrenti) su un database reso lento artificialmente.
+# Le applicazioni vengono chiamate direttamente, senza server HTTP.
+class Command(BaseCommand):
+    help = "Load test WSGI vs ASGI con latenza del database simulata"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=8, help="Thread WSGI disponibili")
+        parser.add_argument("--concurrency", type=int, default=50, help="Richieste ASGI contemporanee")
+        parser.add_argument("--db-delay", type=float, default=0.05, help="Secondi aggiunti a ogni query")
+        parser.add_argument("--sync-path", default="/api/bookings/")
+        parser.add_argument("--async-path", default="/api/async/bookings/")
+
+    def handle(self, *args, **options):
+        delay = options["db_delay"]
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        # Ogni nuova connessione (in qualsiasi thread) riceve il ritardo simulato
+        connection_created.connect(add_delay)
+        connections.close_all()
+        try:
+            results = [
+                ("WSGI", self.run_wsgi(options["sync_path"], options["requests"], options["workers"])),
+                ("ASGI", asyncio.run(
+                    self.run_asgi(options["async_path"], options["requests"], options["concurrency"])
+                )),
+            ]
+        finally:
+            connection_created.disconnect(add_delay)
+
+        self.stdout.write(f"{'':6} {'req/s':>8} {'p50':>9} {'p95':>9} {'errori':>7}")
+        for name, (elapsed, latencies, errors) in results:
+            latencies.sort()
+            p95 = percentile(latencies, 95)
+            self.stdout.write(
+                f"{name:6} {len(latencies) / elapsed:>8.1f} "
+                f"{statistics.median(latencies) * 1000:>7.1f}ms {p95 * 1000:>7.1f}ms {errors:>7}"
+            )
+
+    def run_wsgi(self, path, requests, workers):
+        application = get_wsgi_application()
+
+        def call(_):
+            latency, status = wsgi_get(application, path)
+            return latency, status == 200
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(call, range(requests)))
+        return self.summary(started, outcomes)
+
+    async def run_asgi(self, path, requests, concurrency):
+        application = get_asgi_application()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": b"",
+                "root_path": "",
+                "headers": [(b"host", b"127.0.0.1")],
+                "client": ("127.0.0.1", 50000),
+                "server": ("127.0.0.1", 80),
+            }
+            done = asyncio.Event()
+            request_sent = False
+            statuses = []
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                done.set()
+                return time.perf_counter() - started, statuses[0] == 200
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(call() for _ in range(requests)))
+        return self.summary(started, outcomes)
+
+    def summary(self, started, outcomes):
+        elapsed = time.perf_counter() - started
+        latencies = [latency for latency, _ in outcomes]
+        errors = sum(1 for _, ok in outcomes if not ok)
+        return elapsed, latencies, errors
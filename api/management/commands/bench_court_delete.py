@@ -0,0 +1,85 @@
+import datetime
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api import services
+from api.models import Courts, Schedule, Booking
+
+
+class Rollback(Exception):
+    pass
+
+
+# Confronta la cancellazione di un campo con molte prenotazioni tramite il
+# collector di Django (court.delete()) e tramite services.delete_court (DELETE
+# a blocchi, con e senza archiviazione). Ogni scenario parte dagli stessi dati
+# e viene annullato alla fine: il database non viene modificato.
+class Command(BaseCommand):
+    help = "Benchmark di tempo e memoria della cancellazione di un campo"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        scenarios = [
+            ("court.delete()", lambda court: court.delete()),
+            ("delete_court", lambda court: services.delete_court(court)),
+            ("delete_court+archivio", lambda court: services.delete_court(court, archive=True)),
+        ]
+        self.stdout.write(f"{'':22} {'tempo':>10} {'picco memoria':>14} {'query':>7}")
+        for name, delete in scenarios:
+            try:
+                with transaction.atomic():
+                    court = self.seed(options["bookings"])
+                    elapsed, peak, queries = self.measure(delete, court)
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f"{name:22} {elapsed:>9.2f}s {peak / 2**20:>12.1f}MB {queries:>7}")
+
+    def seed(self, rows):
+        court = Courts.objects.create(court_name="Benchmark", court_type="tennis", court_surface="terra")
+        schedules = Schedule.objects.bulk_create(
+            [Schedule(court=court, time_slot=hour, price=Decimal("20.00")) for hour, _ in Schedule.HOUR_CHOICES]
+        )
+        # Metà delle prenotazioni nel passato, metà nel futuro
+        start = datetime.date.today() - datetime.timedelta(days=rows // len(schedules) // 2)
+        Booking.objects.bulk_create(
+            [
+                Booking(
+                    schedule=schedules[i % len(schedules)],
+                    booking_date=start + datetime.timedelta(days=i // len(schedules)),
+                    name="Mario",
+                    surname="Rossi",
+                    email=f"utente{i}@example.com",
+                    phone="3331234567",
+                )
+                for i in range(rows)
+            ],
+            batch_size=5000,
+        )
+        # Il campo viene ricaricato come farebbe la view
+        return Courts.objects.get(pk=court.pk)
+
+    def measure(self, delete, court):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                delete(court)
+                elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return elapsed, peak, queries
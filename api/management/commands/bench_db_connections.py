@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+from api.management.benchmark import percentile, wsgi_get
+
+
+# Misura la latenza delle richieste con tre strategie di connessione a PostgreSQL:
+# una nuova connessione per richiesta (configurazione storica), connessioni
+# persistenti (CONN_MAX_AGE) e il pool di psycopg 3. Le richieste passano
+# dall'applicazione WSGI, quindi le connessioni vengono chiuse o restituite al
+# pool alla fine di ogni richiesta come in produzione.
+class Command(BaseCommand):
+    help = "Benchmark della latenza con e senza pool di connessioni"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--path", default="/api/bookings/")
+        parser.add_argument("--pool-size", type=int, default=4)
+
+    def handle(self, *args, **options):
+        if connections["default"].vendor != "postgresql":
+            raise CommandError("Il benchmark richiede PostgreSQL.")
+
+        settings_dict = connections.settings["default"]
+        original = {
+            "CONN_MAX_AGE": settings_dict["CONN_MAX_AGE"],
+            "OPTIONS": dict(settings_dict["OPTIONS"]),
+        }
+        scenarios = [
+            ("nuova connessione", 0, None),
+            ("persistente", 600, None),
+            ("pool psycopg", 0, {"min_size": 1, "max_size": options["pool_size"]}),
+        ]
+
+        application = get_wsgi_application()
+        self.stdout.write(f"{'':18} {'p50':>9} {'p95':>9} {'p99':>9}")
+        try:
+            for name, max_age, pool in scenarios:
+                self.configure(settings_dict, max_age, pool)
+                wsgi_get(application, options["path"])  # riscaldamento
+                latencies = sorted(
+                    wsgi_get(application, options["path"])[0] for _ in range(options["requests"])
+                )
+                self.stdout.write(
+                    f"{name:18} "
+                    + " ".join(f"{percentile(latencies, pct) * 1000:>7.1f}ms" for pct in (50, 95, 99))
+                )
+        finally:
+            self.configure(settings_dict, original["CONN_MAX_AGE"], original["OPTIONS"].get("pool"))
+
+    def configure(self, settings_dict, max_age, pool):
+        # Chiude connessioni e pool esistenti prima di cambiare configurazione
+        connections["default"].close()
+        connections["default"].close_pool()
+        settings_dict["CONN_MAX_AGE"] = max_age
+        settings_dict["OPTIONS"].pop("pool", None)
+        if pool:
+            settings_dict["OPTIONS"]["pool"] = pool
+        del connections["default"]
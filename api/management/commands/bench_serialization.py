@@ -0,0 +1,87 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.fastpath import ValuesSerializer
+from api.models import Courts, Schedule, Booking
+from api.renderers import FastJSONRenderer
+from api.serializer import BookingSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+# Confronta la serializzazione delle prenotazioni con il ModelSerializer e con il
+# percorso veloce (.values() + FastJSONRenderer). I dati di prova vengono creati
+# in una transazione annullata alla fine: il database non viene modificato.
+class Command(BaseCommand):
+    help = "Benchmark della serializzazione delle liste di prenotazioni"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["rows"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        court = Courts.objects.create(court_name="Benchmark", court_type="tennis", court_surface="terra")
+        schedules = Schedule.objects.bulk_create(
+            [Schedule(court=court, time_slot=hour, price=Decimal("20.00")) for hour in range(9, 19)]
+        )
+        start = datetime.date(2000, 1, 1)
+        Booking.objects.bulk_create(
+            [
+                Booking(
+                    schedule=schedules[i % len(schedules)],
+                    booking_date=start + datetime.timedelta(days=i // len(schedules)),
+                    name="Mario",
+                    surname="Rossi",
+                    email=f"utente{i}@example.com",
+                    phone="3331234567",
+                )
+                for i in range(rows)
+            ],
+            batch_size=1000,
+        )
+        return Booking.objects.filter(schedule__court=court).order_by("booking_date", "booking_id")
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def run(self, sizes, repeat):
+        fast = ValuesSerializer(BookingSerializer)
+        self.stdout.write(f"{'righe':>8} {'serializer':>12} {'veloce':>12} {'speedup':>8}")
+        for rows in sizes:
+            bookings = self.seed(rows)
+
+            def model_path():
+                data = BookingSerializer(bookings.select_related("schedule__court"), many=True).data
+                return JSONRenderer().render(data)
+
+            def fast_path():
+                return FastJSONRenderer().render(fast.rows(bookings))
+
+            if model_path() != fast_path():
+                self.stderr.write("Attenzione: output diversi tra i due percorsi")
+
+            slow = self.best_of(repeat, model_path)
+            quick = self.best_of(repeat, fast_path)
+            self.stdout.write(
+                f"{rows:>8} {slow * 1000:>10.1f}ms {quick * 1000:>10.1f}ms {slow / quick:>7.1f}x"
+            )
@@ -0,0 +1,89 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Eseguito in un nuovo interprete: carica l'applicazione WSGI e l'URLconf (come
+# la prima richiesta di un avvio a freddo) e stampa tempo e memoria residente.
+# ru_maxrss è in KB su Linux (in byte su macOS).
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+from django.urls import resolve
+get_wsgi_application()
+resolve(sys.argv[1])
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+# Misura l'avvio a freddo dei profili di settings (completo e solo API) in
+# processi separati. Con --top mostra i moduli più lenti da importare secondo
+# "python -X importtime".
+class Command(BaseCommand):
+    help = "Benchmark del tempo di avvio a freddo e della memoria per profilo di settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--settings-modules",
+            nargs="+",
+            default=["campoclick_be.settings", "campoclick_be.settings_api"],
+        )
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--path", default="/api/courts/")
+        parser.add_argument("--top", type=int, default=10, help="Moduli più lenti da mostrare (0 = nessuno)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'settings':32} {'processo':>10} {'setup':>10} {'RSS':>9} {'moduli':>7}"
+        )
+        for module in options["settings_modules"]:
+            runs = [self.run_child(module, options["path"]) for _ in range(options["runs"])]
+            wall = statistics.median(run["wall"] for run in runs)
+            setup = statistics.median(run["seconds"] for run in runs)
+            rss = max(run["rss_kb"] for run in runs)
+            self.stdout.write(
+                f"{module:32} {wall * 1000:>8.1f}ms {setup * 1000:>8.1f}ms "
+                f"{rss / 1024:>7.1f}MB {runs[0]['modules']:>7}"
+            )
+
+        if options["top"]:
+            for module in options["settings_modules"]:
+                self.stdout.write(f"\nImport più lenti con {module} (cumulativo):")
+                for micros, name in self.slowest_imports(module, options["path"], options["top"]):
+                    self.stdout.write(f"{micros / 1000:>9.1f}ms  {name}")
+
+    def run_child(self, module, path, *flags):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": module}
+        started = time.perf_counter()
+        child = subprocess.run(
+            [sys.executable, *flags, "-c", CHILD, path], env=env, capture_output=True, text=True
+        )
+        wall = time.perf_counter() - started
+        if child.returncode != 0:
+            raise CommandError(f"Avvio fallito con {module}:\n{child.stderr}")
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        result["wall"] = wall
+        result["stderr"] = child.stderr
+        return result
+
+    # Righe di -X importtime: "import time: <self us> | <cumulativo us> | <modulo>"
+    def slowest_imports(self, module, path, top):
+        stderr = self.run_child(module, path, "-X", "importtime")["stderr"]
+        imports = []
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            # Solo i moduli di primo livello del nostro codice o importati direttamente
+            if not name.startswith("   "):
+                imports.append((int(cumulative), name.strip()))
+        return sorted(imports, reverse=True)[:top]
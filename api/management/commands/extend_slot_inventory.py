@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inventory
+
+
+# Da eseguire ogni giorno (es: cron): fa avanzare l'orizzonte dell'inventario
+# degli slot ed elimina i giorni passati
+class Command(BaseCommand):
+    help = "Estende l'inventario precalcolato degli slot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.SLOT_INVENTORY_DAYS)
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days deve essere almeno 1.")
+        created = inventory.extend(options["days"])
+        self.stdout.write(f"Righe create: {created}. Orizzonte: {inventory.horizon()}")
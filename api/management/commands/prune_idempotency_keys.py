@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.models import IdempotencyKey
+from api.services import idempotency_cutoff
+
+
+# Da eseguire periodicamente (es: cron): elimina le Idempotency-Key scadute,
+# che non verrebbero più riprodotte, così la tabella non cresce senza limiti
+class Command(BaseCommand):
+    help = "Elimina le Idempotency-Key oltre la finestra di validità"
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=idempotency_cutoff()).delete()
+        self.stdout.write(f"Idempotency-Key eliminate: {deleted}")
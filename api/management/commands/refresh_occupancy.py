@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api import reports
+
+
+# Ricalcola le righe del riepilogo di occupazione marcate come stale (es: ogni
+# pochi minuti da cron). Finché una riga è stale i report sommano le
+# prenotazioni di quel giorno, quindi più righe stale rendono i report più lenti.
+# Con --rebuild il riepilogo viene ricostruito da tutte le prenotazioni.
+class Command(BaseCommand):
+    help = "Aggiorna il riepilogo giornaliero di occupazione e incassi"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            self.stdout.write(f"Righe ricostruite: {reports.rebuild_rollups()}")
+        else:
+            self.stdout.write(f"Righe ricalcolate: {reports.refresh_rollups()}")
@@ -0,0 +1,98 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import inventory, reports
+from api.cache import invalidate_courts, touch_tables
+from api.models import Courts, Schedule, Booking
+
+SPORTS = ["tennis", "padel", "calcetto", "basket", "pallavolo"]
+SURFACES = ["terra", "erba sintetica", "cemento", "parquet"]
+NAMES = ["Mario", "Luca", "Giulia", "Francesca", "Marco", "Sara", "Paolo", "Elena"]
+SURNAMES = ["Rossi", "Bianchi", "Russo", "Ferrari", "Esposito", "Romano", "Colombo", "Ricci"]
+
+
+# Genera dati realistici per test di carico e benchmark: campi con la griglia
+# completa di orari (9-18) e mesi di prenotazioni con densità configurabile.
+# Gli inserimenti usano bulk_create a blocchi, quindi i segnali non partono:
+# cache e inventario vengono aggiornati alla fine. Da usare su un database dedicato.
+class Command(BaseCommand):
+    help = "Popola il database con campi, orari e prenotazioni sintetiche"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courts", type=int, default=1000)
+        parser.add_argument("--days", type=int, default=90, help="Giorni di prenotazioni")
+        parser.add_argument(
+            "--start", type=datetime.date.fromisoformat, help="Primo giorno (AAAA-MM-GG), default oggi"
+        )
+        parser.add_argument("--density", type=float, default=0.3, help="Frazione di slot prenotati (0-1)")
+        parser.add_argument("--seed", type=int, default=0, help="Seme casuale per dati ripetibili")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["density"] <= 1:
+            raise CommandError("--density deve essere compreso tra 0 e 1.")
+        rng = random.Random(options["seed"])
+        start = options["start"] or datetime.date.today()
+        batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            courts = Courts.objects.bulk_create(
+                [
+                    Courts(
+                        court_name=f"Campo {index + 1}",
+                        court_type=rng.choice(SPORTS),
+                        court_surface=rng.choice(SURFACES),
+                    )
+                    for index in range(options["courts"])
+                ],
+                batch_size=batch_size,
+            )
+            schedules = Schedule.objects.bulk_create(
+                [
+                    Schedule(court=court, time_slot=hour, price=Decimal(rng.choice([15, 20, 25, 30])))
+                    for court in courts
+                    for hour, _ in Schedule.HOUR_CHOICES
+                ],
+                batch_size=batch_size,
+            )
+
+            bookings = 0
+            batch = []
+            for offset in range(options["days"]):
+                date = start + datetime.timedelta(days=offset)
+                for schedule in schedules:
+                    if rng.random() >= options["density"]:
+                        continue
+                    name, surname = rng.choice(NAMES), rng.choice(SURNAMES)
+                    batch.append(
+                        Booking(
+                            schedule=schedule,
+                            booking_date=date,
+                            name=name,
+                            surname=surname,
+                            email=f"{name}.{surname}{rng.randrange(10000)}@example.com".lower(),
+                            phone=f"3{rng.randrange(10**8, 10**9)}",
+                        )
+                    )
+                    if len(batch) == batch_size:
+                        Booking.objects.bulk_create(batch)
+                        bookings += len(batch)
+                        batch = []
+            Booking.objects.bulk_create(batch)
+            bookings += len(batch)
+
+            # I campi nuovi non hanno dati in cache: basta aggiornare l'elenco
+            invalidate_courts(listing=True)
+            touch_tables("courts", "schedules", "bookings")
+            if inventory.inventory_enabled():
+                inventory.extend(options["days"], today=start)
+            if reports.rollup_enabled():
+                reports.rebuild_rollups()
+
+        self.stdout.write(
+            f"Creati {len(courts)} campi, {len(schedules)} orari e {bookings} prenotazioni."
+        )
@@ -0,0 +1,110 @@
+import bisect
+import threading
+import time
+
+# Metriche di processo in formato Prometheus (testo, versione 0.0.4), raccolte
+# da PerformanceMiddleware (middleware.py). Ogni processo ha il proprio
+# registro: Prometheus somma le serie dei diversi worker.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Peso dell'ultima query nella media mobile esponenziale della latenza del database
+EWMA_ALPHA = 0.1
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, view, value):
+        counts, total = self.series.get(view, ([0] * (len(self.buckets) + 1), 0))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.series[view] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for view, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {total}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = [
+            Histogram("campoclick_request_duration_seconds", "Durata della richiesta.", DURATION_BUCKETS),
+            Histogram("campoclick_db_duration_seconds", "Tempo speso nelle query SQL.", DURATION_BUCKETS),
+            Histogram("campoclick_db_queries", "Query SQL per richiesta.", QUERY_BUCKETS),
+            Histogram("campoclick_render_duration_seconds", "Tempo di serializzazione della risposta.", DURATION_BUCKETS),
+            Histogram("campoclick_response_bytes", "Dimensione della risposta.", SIZE_BUCKETS),
+        ]
+        self.over_budget = {}
+        self.in_flight = 0
+        self.db_latency = None
+        self.db_latency_at = None
+
+    def observe_request(self, view, duration, db_time, queries, render_time, size, over_budget):
+        with self.lock:
+            for histogram, value in zip(self.histograms, (duration, db_time, queries, render_time, size)):
+                if value is not None:
+                    histogram.observe(view, value)
+            if over_budget:
+                self.over_budget[view] = self.over_budget.get(view, 0) + 1
+
+    def observe_query(self, duration):
+        with self.lock:
+            if self.db_latency is None:
+                self.db_latency = duration
+            else:
+                self.db_latency += EWMA_ALPHA * (duration - self.db_latency)
+            self.db_latency_at = time.monotonic()
+
+    # Latenza media del database, se misurata negli ultimi max_age secondi
+    # (now è un istante di time.monotonic())
+    def recent_db_latency(self, now, max_age):
+        if self.db_latency_at is None or now - self.db_latency_at > max_age:
+            return None
+        return self.db_latency
+
+    def add_in_flight(self, delta):
+        with self.lock:
+            self.in_flight += delta
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for histogram in self.histograms:
+                lines += histogram.render()
+            lines += [
+                "# HELP campoclick_query_budget_exceeded_total Richieste oltre PERF_QUERY_BUDGET.",
+                "# TYPE campoclick_query_budget_exceeded_total counter",
+            ]
+            lines += [
+                f'campoclick_query_budget_exceeded_total{{view="{view}"}} {count}'
+                for view, count in sorted(self.over_budget.items())
+            ]
+            lines += [
+                "# HELP campoclick_requests_in_flight Richieste in corso.",
+                "# TYPE campoclick_requests_in_flight gauge",
+                f"campoclick_requests_in_flight {self.in_flight}",
+                "# HELP campoclick_db_latency_seconds Media mobile esponenziale della durata delle query.",
+                "# TYPE campoclick_db_latency_seconds gauge",
+                f"campoclick_db_latency_seconds {self.db_latency or 0}",
+            ]
+            return "\n".join(lines) + "\n"
+
+
+registry = Registry()
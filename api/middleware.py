@@ -0,0 +1,124 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+# Misure della richiesta in corso. Le view asincrone eseguono l'ORM in altri
+# thread (sync_to_async), che ricevono una copia del contesto: le query vengono
+# attribuite alla richiesta da cui partono.
+_current_perf = ContextVar("current_perf", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    perf = _current_perf.get()
+    if perf is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        perf["queries"] += 1
+        perf["db_time"] += elapsed
+        registry.observe_query(elapsed)
+
+
+# Ogni connessione (una per thread) registra le query della richiesta corrente
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Misura ogni richiesta: durata totale, numero e durata delle query SQL, tempo
+# di serializzazione (render della Response di DRF) e dimensione della risposta.
+# I valori finiscono nell'header Server-Timing e nel registro Prometheus
+# esposto da /api/metrics/. Le richieste con più query di PERF_QUERY_BUDGET
+# vengono segnalate nel log e nel contatore campoclick_query_budget_exceeded_total.
+# Supporta sia WSGI sia ASGI: con le view asincrone non aggiunge passaggi di thread.
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # La connessione del thread può essere stata aperta prima del caricamento del middleware
+        install_query_recorder(None, connection)
+        started, token = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.end(token)
+        return self.finish(request, response, started)
+
+    async def __acall__(self, request):
+        started, token = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.end(token)
+        return self.finish(request, response, started)
+
+    def begin(self, request):
+        request._perf = {"queries": 0, "db_time": 0.0, "render_time": None}
+        registry.add_in_flight(1)
+        return time.perf_counter(), _current_perf.set(request._perf)
+
+    def end(self, token):
+        _current_perf.reset(token)
+        registry.add_in_flight(-1)
+
+    def finish(self, request, response, started):
+        duration = time.perf_counter() - started
+        perf = request._perf
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        size = None if response.streaming else len(response.content)
+        budget = getattr(settings, "PERF_QUERY_BUDGET", 0)
+        over_budget = bool(budget) and perf["queries"] > budget
+        if over_budget:
+            logger.warning(
+                "%s %s: %d query (budget %d)", request.method, request.path, perf["queries"], budget
+            )
+
+        registry.observe_request(
+            view, duration, perf["db_time"], perf["queries"], perf["render_time"], size, over_budget
+        )
+        response["Server-Timing"] = self.server_timing(duration, perf, over_budget)
+        return response
+
+    # Le Response di DRF vengono serializzate dopo process_template_response:
+    # il tempo di render si misura da qui alla callback successiva al render
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._perf["render_time"] = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def server_timing(duration, perf, over_budget):
+        desc = f'{perf["queries"]} query' + (" (oltre il budget)" if over_budget else "")
+        metrics = [f'db;dur={perf["db_time"] * 1000:.1f};desc="{desc}"']
+        if perf["render_time"] is not None:
+            metrics.append(f'render;dur={perf["render_time"] * 1000:.1f}')
+        metrics.append(f"total;dur={duration * 1000:.1f}")
+        return ", ".join(metrics)
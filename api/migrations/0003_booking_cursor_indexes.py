@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-18 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date', 'booking_datetime', 'booking_id'], name='booking_date_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['email', 'booking_date'], name='booking_email_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 00:37
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_booking_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courts',
+            index=models.Index(django.db.models.functions.text.Upper('court_type'), name='courts_type_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1 on 2026-10-18 00:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_courts_type_upper_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('is_booked', models.BooleanField(default=False)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory', to='api.schedule')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'is_booked', 'schedule'], name='inventory_date_idx')],
+                'unique_together': {('schedule', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1 on 2026-10-18 00:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_slotinventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('stale', models.BooleanField(default=False)),
+                ('court', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.courts')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'court'], name='rollup_date_idx'), models.Index(condition=models.Q(('stale', True)), fields=['stale'], name='rollup_stale_idx')],
+                'unique_together': {('court', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_occupancyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingArchive',
+            fields=[
+                ('booking_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('court_id', models.IntegerField()),
+                ('court_name', models.CharField(max_length=100)),
+                ('court_type', models.CharField(max_length=100)),
+                ('court_image_url', models.URLField(blank=True, max_length=255, null=True)),
+                ('schedule_id', models.IntegerField()),
+                ('time_slot', models.IntegerField(choices=[(9, '09:00'), (10, '10:00'), (11, '11:00'), (12, '12:00'), (13, '13:00'), (14, '14:00'), (15, '15:00'), (16, '16:00'), (17, '17:00'), (18, '18:00')])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('booking_date', models.DateField()),
+                ('name', models.CharField(max_length=100)),
+                ('surname', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('phone', models.CharField(max_length=20)),
+                ('booking_datetime', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['booking_date'], name='archive_date_idx'), models.Index(fields=['court_id', 'booking_date'], name='archive_court_date_idx'), models.Index(fields=['email', 'booking_date'], name='archive_email_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-18 01:05
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_bookingarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='price_charged',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookingarchive',
+            name='price_charged',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+        ),
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('sport', models.CharField(blank=True, max_length=100)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('weekdays', models.CharField(blank=True, max_length=7, validators=[django.core.validators.RegexValidator('^[0-6]*$', 'Usare cifre da 0 (lunedì) a 6.')])),
+                ('first_slot', models.IntegerField(blank=True, choices=[(9, '09:00'), (10, '10:00'), (11, '11:00'), (12, '12:00'), (13, '13:00'), (14, '14:00'), (15, '15:00'), (16, '16:00'), (17, '17:00'), (18, '18:00')], null=True)),
+                ('last_slot', models.IntegerField(blank=True, choices=[(9, '09:00'), (10, '10:00'), (11, '11:00'), (12, '12:00'), (13, '13:00'), (14, '14:00'), (15, '15:00'), (16, '16:00'), (17, '17:00'), (18, '18:00')], null=True)),
+                ('min_occupancy', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)])),
+                ('percent', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('priority', models.IntegerField(default=0)),
+                ('active', models.BooleanField(default=True)),
+                ('court', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pricing_rules', to='api.courts')),
+            ],
+        ),
+    ]
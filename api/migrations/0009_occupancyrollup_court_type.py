@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+# Le righe esistenti non hanno il tipo di campo: vengono ricalcolate dal
+# prossimo refresh_occupancy (nel frattempo i report leggono le prenotazioni)
+def mark_rollups_stale(apps, schema_editor):
+    apps.get_model("api", "OccupancyRollup").objects.update(stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_pricing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='occupancyrollup',
+            name='court_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(mark_rollups_stale, migrations.RunPython.noop),
+    ]
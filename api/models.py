@@ -1,5 +1,6 @@
 from django.db import models
-from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
+from django.db.models.functions import Upper
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 import uuid  # Importa il modulo uuid per generare ID univoci
@@ -14,6 +15,12 @@ class Courts(models.Model):
     image_url = models.URLField(max_length=255, blank=True, null=True)
     image_credit = models.CharField(max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Filtro per sport senza distinzione tra maiuscole e minuscole (court_type__iexact)
+            models.Index(Upper("court_type"), name="courts_type_upper_idx"),
+        ]
+
     def __str__(self):
         return f"{self.court_name} ({self.court_type})"
 
@@ -40,8 +47,17 @@ class Schedule(models.Model):
     def __str__(self):
         return f"{self.court.court_name} - {self.get_time_slot_display()} - {self.price}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Memorizza il campo originale per invalidare la cache anche se l'orario cambia campo
+        instance._loaded_court_id = instance.__dict__.get("court_id")
+        return instance
+
     def is_available(self, date):
-        return not self.bookings.filter(booking_date=date).exists()
+        from .availability import is_slot_available
+
+        return is_slot_available(self.pk, date)
 
 
 # Modello per le prenotazioni
@@ -55,18 +71,287 @@ class Booking(models.Model):
     email = models.EmailField()
     phone = models.CharField(max_length=20)
     booking_datetime = models.DateTimeField(auto_now_add=True)
+    # Prezzo effettivo al momento della prenotazione (api/pricing.py); vuoto per
+    # le prenotazioni precedenti alle regole di prezzo, che usano il prezzo dell'orario
+    price_charged = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
 
     class Meta:
         # Assicura che non ci siano prenotazioni duplicate per lo stesso campo, data e ora
         unique_together = ["schedule", "booking_date"]
+        indexes = [
+            # Ordinamento della paginazione a cursore e filtri per intervallo di date
+            models.Index(
+                fields=["booking_date", "booking_datetime", "booking_id"],
+                name="booking_date_cursor_idx",
+            ),
+            # Ricerca delle prenotazioni di un utente
+            models.Index(fields=["email", "booking_date"], name="booking_email_date_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Memorizza lo slot originale per invalidare la cache anche se la prenotazione viene spostata
+        instance._loaded_schedule_id = instance.__dict__.get("schedule_id")
+        instance._loaded_booking_date = instance.__dict__.get("booking_date")
+        return instance
 
     def __str__(self):
         return f"Booking {self.booking_id.hex[:8]} - {self.name} {self.surname} - {self.schedule.court.court_name} - {self.booking_date} {self.schedule.get_time_slot_display()}"
 
     def clean(self):
         from django.core.exceptions import ValidationError
+        from .availability import is_slot_available
 
         # Verifica se lo slot orario è disponibile per la data selezionata
-        if not self.schedule.is_available(self.booking_date): 
+        # (esclude la prenotazione stessa in caso di modifica)
+        exclude = None if self._state.adding else self.pk
+        if not is_slot_available(self.schedule_id, self.booking_date, exclude_booking=exclude):
             raise ValidationError("Questo slot orario non è disponibile per la data selezionata.")
 
+
+# Regola di prezzo (api/pricing.py): modifica il prezzo base degli orari che
+# soddisfano tutte le condizioni impostate; le condizioni vuote valgono sempre.
+# Il prezzo diventa prezzo * (100 + percent) / 100 + amount, applicando le
+# regole in ordine di priorità.
+class PricingRule(models.Model):
+    name = models.CharField(max_length=100)
+    court = models.ForeignKey(
+        Courts, on_delete=models.CASCADE, null=True, blank=True, related_name="pricing_rules"
+    )
+    sport = models.CharField(max_length=100, blank=True)  # court_type, senza distinzione tra maiuscole e minuscole
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    # Giorni della settimana come cifre, 0 = lunedì (es: "56" per il fine settimana)
+    weekdays = models.CharField(
+        max_length=7, blank=True, validators=[RegexValidator(r"^[0-6]*$", "Usare cifre da 0 (lunedì) a 6.")]
+    )
+    first_slot = models.IntegerField(choices=Schedule.HOUR_CHOICES, null=True, blank=True)
+    last_slot = models.IntegerField(choices=Schedule.HOUR_CHOICES, null=True, blank=True)
+    # Occupazione minima del campo nella giornata (0-1) per applicare la regola
+    min_occupancy = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+    )
+    percent = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    priority = models.IntegerField(default=0)
+    active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.percent:+}% {self.amount:+})"
+
+
+# Inventario precalcolato degli slot (opzionale, settings.SLOT_INVENTORY): una riga
+# per ogni (schedule, data) in un orizzonte mobile. La disponibilità diventa una
+# lettura su indice e la prenotazione un UPDATE condizionale su is_booked.
+class SlotInventory(models.Model):
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name="inventory")
+    date = models.DateField()
+    is_booked = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ["schedule", "date"]
+        indexes = [
+            # Slot liberi/occupati di una data (o di un intervallo di date)
+            models.Index(fields=["date", "is_booked", "schedule"], name="inventory_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.schedule_id} - {self.date} ({'occupato' if self.is_booked else 'libero'})"
+
+
+# Riepilogo giornaliero per campo usato dai report di occupazione (opzionale,
+# settings.OCCUPANCY_ROLLUP). Le scritture sulle prenotazioni marcano la riga
+# come "stale" e reports.refresh_rollups() la ricalcola.
+class OccupancyRollup(models.Model):
+    # Senza vincolo: le prenotazioni cancellate insieme al campo marcano ancora le
+    # righe, che al ricalcolo restano senza prenotazioni e vengono eliminate
+    court = models.ForeignKey(
+        Courts, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    date = models.DateField()
+    # Copiato dalle prenotazioni: i report per sport non fanno join con i campi,
+    # che possono essere stati cancellati (prenotazioni archiviate)
+    court_type = models.CharField(max_length=100, blank=True)
+    bookings = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    stale = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ["court", "date"]
+        indexes = [
+            models.Index(fields=["date", "court"], name="rollup_date_idx"),
+            # Solo le righe da ricalcolare (di solito poche)
+            models.Index(fields=["stale"], condition=models.Q(stale=True), name="rollup_stale_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.court_id} - {self.date}: {self.bookings} ({self.revenue})"
+
+
+# Archivio delle prenotazioni passate (api/archive.py). I dati del campo e
+# dell'orario sono copiati nella riga, così l'archivio resta leggibile anche
+# dopo la cancellazione del campo o dell'orario.
+class BookingArchive(models.Model):
+    booking_id = models.UUIDField(primary_key=True)
+    court_id = models.IntegerField()
+    court_name = models.CharField(max_length=100)
+    court_type = models.CharField(max_length=100)
+    court_image_url = models.URLField(max_length=255, blank=True, null=True)
+    schedule_id = models.IntegerField()
+    time_slot = models.IntegerField(choices=Schedule.HOUR_CHOICES)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+    booking_date = models.DateField()
+    name = models.CharField(max_length=100)
+    surname = models.CharField(max_length=100)
+    email = models.EmailField()
+    phone = models.CharField(max_length=20)
+    booking_datetime = models.DateTimeField()
+    price_charged = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["booking_date"], name="archive_date_idx"),
+            models.Index(fields=["court_id", "booking_date"], name="archive_court_date_idx"),
+            models.Index(fields=["email", "booking_date"], name="archive_email_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archivio {self.booking_id.hex[:8]} - {self.name} {self.surname} - {self.court_name} - {self.booking_date}"
+
+
+# Chiavi di idempotenza per la creazione delle prenotazioni: un client che ripete
+# la stessa richiesta con lo stesso header Idempotency-Key riceve la risposta originale
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255, primary_key=True)
+    fingerprint = models.CharField(max_length=64)  # Hash del corpo della richiesta
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    # Le chiavi scadute vengono eliminate per data di creazione (prune_idempotency_keys)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
+
+
+# ********** INVALIDAZIONE CACHE **********
+
+
+def _courts_of_schedules(*schedule_ids):
+    return set(
+        Schedule.objects.filter(pk__in=[pk for pk in schedule_ids if pk is not None])
+        .values_list("court_id", flat=True)
+    )
+
+
+@receiver([post_save, post_delete], sender=Courts)
+def invalidate_court_cache(sender, instance, **kwargs):
+    from .cache import invalidate_courts, touch_tables
+
+    invalidate_courts(instance.pk, listing=True)
+    touch_tables("courts")
+
+
+@receiver(post_save, sender=Courts)
+def mark_court_rollup(sender, instance, created, **kwargs):
+    from . import reports
+
+    # Il riepilogo conserva il tipo di campo: va ricalcolato se cambia
+    if not created and reports.rollup_enabled():
+        reports.mark_stale_courts(instance.pk)
+
+
+@receiver(post_save, sender=Schedule)
+def add_schedule_inventory(sender, instance, created, **kwargs):
+    from . import inventory
+
+    # Un nuovo orario riceve subito le righe di inventario dell'orizzonte corrente
+    if created and inventory.inventory_enabled():
+        inventory.add_schedules([instance])
+
+
+@receiver(post_save, sender=Schedule)
+def mark_schedule_rollup(sender, instance, created, **kwargs):
+    from . import reports
+
+    # Un cambio di prezzo modifica gli incassi di tutti i giorni del campo
+    if not created and reports.rollup_enabled():
+        reports.mark_stale_courts(instance.court_id, getattr(instance, "_loaded_court_id", None))
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def sync_booking_inventory(sender, instance, **kwargs):
+    from . import inventory
+
+    if inventory.inventory_enabled():
+        inventory.sync_slots(
+            [
+                (instance.schedule_id, instance.booking_date),
+                (getattr(instance, "_loaded_schedule_id", None), getattr(instance, "_loaded_booking_date", None)),
+            ]
+        )
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def mark_booking_rollup(sender, instance, **kwargs):
+    from . import reports
+
+    if reports.rollup_enabled():
+        reports.mark_stale_slots(
+            [
+                (instance.schedule_id, instance.booking_date),
+                (getattr(instance, "_loaded_schedule_id", None), getattr(instance, "_loaded_booking_date", None)),
+            ]
+        )
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def publish_booking_slots(sender, instance, signal, **kwargs):
+    from . import pubsub
+
+    if not pubsub.live_updates_enabled():
+        return
+    current = (instance.schedule_id, instance.booking_date)
+    if signal is post_delete:
+        pubsub.publish_slots(freed=[current])
+        return
+    previous = (getattr(instance, "_loaded_schedule_id", None), getattr(instance, "_loaded_booking_date", None))
+    pubsub.publish_slots(taken=[current], freed=[previous] if previous != current else [])
+
+
+@receiver([post_save, post_delete], sender=PricingRule)
+def invalidate_pricing_cache(sender, instance, **kwargs):
+    from . import pricing
+
+    pricing.invalidate_rules()
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+def invalidate_schedule_cache(sender, instance, **kwargs):
+    from .cache import invalidate_courts, touch_tables
+
+    invalidate_courts(instance.court_id, getattr(instance, "_loaded_court_id", None))
+    touch_tables("schedules")
+    instance._loaded_court_id = instance.court_id
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_booking_cache(sender, instance, **kwargs):
+    from .cache import invalidate_courts, touch_tables
+
+    previous = getattr(instance, "_loaded_schedule_id", None)
+    if Booking.schedule.is_cached(instance) and previous in (None, instance.schedule_id):
+        # Evita una query se lo slot è già stato caricato
+        court_ids = {instance.schedule.court_id}
+    else:
+        court_ids = _courts_of_schedules(instance.schedule_id, previous)
+    invalidate_courts(*court_ids)
+    touch_tables("bookings")
+    # Ultimo receiver sulle prenotazioni: da qui in poi lo slot salvato è quello "originale"
+    instance._loaded_schedule_id = instance.schedule_id
+    instance._loaded_booking_date = instance.booking_date
@@ -0,0 +1,97 @@
+import base64
+import json
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Paginazione keyset (a cursore) per le prenotazioni, ordinate per
+# (booking_date, booking_datetime, booking_id). Ogni pagina parte dall'ultima
+# riga della precedente con un range scan sull'indice: costo costante anche
+# con centinaia di migliaia di prenotazioni, a differenza di OFFSET.
+class BookingKeysetPagination(BasePagination):
+    # Colonne della posizione: vanno lette anche se non sono tra i campi richiesti
+    ordering = ("booking_date", "booking_datetime", "booking_id")
+    cursor_query_param = "cursor"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Cursore non valido."
+
+    # Si usa request.GET così il paginatore funziona anche con le view asincrone
+    # (HttpRequest di Django); la Request di DRF delega GET alla richiesta originale
+    def get_page_size(self, request):
+        try:
+            size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    # La pagina può contenere istanze di Booking o righe grezze di .values()
+    def encode_cursor(self, booking):
+        if not isinstance(booking, dict):
+            booking = vars(booking)
+        position = [
+            booking["booking_date"].isoformat(),
+            booking["booking_datetime"].isoformat(),
+            str(booking["booking_id"]),
+        ]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, created, booking_id = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position = (parse_date(date), parse_datetime(created), uuid.UUID(booking_id))
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    # Queryset della pagina richiesta (una riga in più per sapere se esiste una pagina successiva)
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            date, created, booking_id = position
+            queryset = queryset.filter(
+                Q(booking_date__gt=date)
+                | Q(booking_date=date, booking_datetime__gt=created)
+                | Q(booking_date=date, booking_datetime=created, booking_id__gt=booking_id)
+            )
+
+        return queryset[: self.current_page_size + 1]
+
+    def finish_page(self, rows):
+        self.has_next = len(rows) > self.current_page_size
+        page = rows[: self.current_page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.get_page_queryset(queryset, request)))
+
+    # Versione per le view asincrone (ORM asincrono di Django)
+    async def apaginate_queryset(self, queryset, request):
+        rows = [row async for row in self.get_page_queryset(queryset, request)]
+        return self.finish_page(rows)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
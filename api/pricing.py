@@ -0,0 +1,168 @@
+from decimal import Decimal
+
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .cache import bump_versions, get_or_compute, get_or_compute_per_court, get_versions, touch_tables
+from .models import Schedule, Booking, PricingRule
+
+# Prezzi dinamici: le regole (PricingRule) vengono compilate in una tabella
+# {schedule_id: prezzo} per ogni (campo, data), tenuta nella cache versionata
+# per campo. Le risposte e le prenotazioni leggono il prezzo dalla tabella,
+# senza valutare le regole riga per riga. La tabella di un campo viene
+# ricalcolata quando cambiano i suoi orari o le sue prenotazioni (le regole
+# sull'occupazione dipendono da queste) e quando cambia una qualsiasi regola.
+# Nella tabella ci sono solo gli orari con un prezzo diverso da quello base.
+
+PRICING_SCOPE = "pricing"
+
+CENT = Decimal("0.01")
+
+
+# Versione delle regole, da includere nelle chiavi di cache dei valori che contengono prezzi
+def rules_version():
+    return get_versions([PRICING_SCOPE])[PRICING_SCOPE]
+
+
+def format_price(price):
+    return str(Decimal(price).quantize(CENT))
+
+
+def invalidate_rules():
+    bump_versions(PRICING_SCOPE)
+    touch_tables("pricing")
+
+
+# Regole attive, in cache fino alla prossima modifica di una regola (la tabella
+# è piccola: il filtro per data e campo avviene in memoria)
+def active_rules():
+    return get_or_compute(
+        "pricing_rules",
+        PRICING_SCOPE,
+        [],
+        lambda: list(PricingRule.objects.filter(active=True).order_by("priority", "pk")),
+    )
+
+
+def _valid_on(rule, date):
+    return (rule.start_date is None or rule.start_date <= date) and (rule.end_date is None or rule.end_date >= date)
+
+
+def _applies(rule, court_id, sport, time_slot, date, occupancy):
+    return (
+        (rule.court_id is None or rule.court_id == court_id)
+        and (not rule.sport or rule.sport.lower() == sport)
+        and (not rule.weekdays or str(date.weekday()) in rule.weekdays)
+        and (rule.first_slot is None or time_slot >= rule.first_slot)
+        and (rule.last_slot is None or time_slot <= rule.last_slot)
+        and (rule.min_occupancy is None or occupancy >= rule.min_occupancy)
+    )
+
+
+def apply_rules(price, rules, **conditions):
+    for rule in rules:
+        if _applies(rule, **conditions):
+            price = price * (100 + rule.percent) / 100 + rule.amount
+    return max(price, Decimal(0)).quantize(CENT)
+
+
+# Compila le tabelle dei prezzi delle date per i campi indicati:
+# {data: {court_id: tabella}}. Le query partono solo se qualche regola vale in
+# una delle date: una per gli orari e una per l'occupazione (solo con regole
+# sull'occupazione), qualunque sia il numero di date.
+def compile_prices(dates, court_ids):
+    all_rules = active_rules()
+    rules = {
+        date: [rule for rule in all_rules if _valid_on(rule, date) and rule.court_id in (None, *court_ids)]
+        for date in dates
+    }
+    tables = {date: {court_id: {} for court_id in court_ids} for date in dates}
+    if not any(rules.values()):
+        return tables
+
+    schedules = list(
+        Schedule.objects.filter(court_id__in=court_ids).values_list(
+            "pk", "court_id", "court__court_type", "time_slot", "price"
+        )
+    )
+    slots = {}
+    for _, court_id, _, _, _ in schedules:
+        slots[court_id] = slots.get(court_id, 0) + 1
+    booked = {}
+    if any(rule.min_occupancy is not None for date_rules in rules.values() for rule in date_rules):
+        booked = {
+            (date, court_id): count
+            for date, court_id, count in Booking.objects.filter(
+                booking_date__in=dates, schedule__court_id__in=court_ids
+            )
+            .values("booking_date", "schedule__court_id")
+            .annotate(count=Count("pk"))
+            .values_list("booking_date", "schedule__court_id", "count")
+            .order_by()
+        }
+
+    for date, date_rules in rules.items():
+        if not date_rules:
+            continue
+        for pk, court_id, sport, time_slot, price in schedules:
+            occupancy = Decimal(booked.get((date, court_id), 0)) / slots[court_id]
+            effective = apply_rules(
+                price,
+                date_rules,
+                court_id=court_id,
+                sport=sport.lower(),
+                time_slot=time_slot,
+                date=date,
+                occupancy=occupancy,
+            )
+            if effective != price:
+                tables[date][court_id][pk] = format_price(effective)
+    return tables
+
+
+# Tabelle dei prezzi della data: {court_id: {schedule_id: "prezzo"}}
+def price_tables(date, court_ids):
+    return get_or_compute_per_court(
+        "prices",
+        court_ids,
+        [date, rules_version()],
+        lambda missing: compile_prices([date], missing)[date],
+        default={},
+    )
+
+
+# Annota le schedules del queryset con "has_pricing_rules" (regole attive per il
+# loro campo) nella stessa query: senza regole il prezzo effettivo è quello base
+# e le regole non vengono lette
+def with_rules_flag(queryset):
+    rules = PricingRule.objects.filter(Q(court__isnull=True) | Q(court=OuterRef("court_id")), active=True)
+    return queryset.annotate(has_pricing_rules=Exists(rules))
+
+
+def _has_rules(schedule):
+    return getattr(schedule, "has_pricing_rules", True)
+
+
+def _price(tables, schedule):
+    table = tables[schedule.court_id]
+    return Decimal(table[schedule.pk]) if schedule.pk in table else schedule.price
+
+
+def effective_price(schedule, date):
+    if not _has_rules(schedule):
+        return schedule.price
+    return _price(price_tables(date, [schedule.court_id]), schedule)
+
+
+# Prezzi effettivi (Decimal) di più coppie (orario, data), es: prenotazioni
+# multiple: {(schedule_id, data): prezzo}. Tutte le date vengono compilate
+# insieme, con un numero di query che non dipende dalle date.
+def effective_prices(slots):
+    slots = list(slots)
+    prices = {(schedule.pk, date): schedule.price for schedule, date in slots}
+    priced = [(schedule, date) for schedule, date in slots if _has_rules(schedule)]
+    if priced:
+        tables = compile_prices(
+            sorted({date for _, date in priced}), sorted({schedule.court_id for schedule, _ in priced})
+        )
+        prices.update({(schedule.pk, date): _price(tables[date], schedule) for schedule, date in priced})
+    return prices
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .models import Schedule
+from .renderers import FastJSONRenderer
+
+# Pub/sub per gli aggiornamenti in tempo reale della disponibilità (opzionale,
+# settings.LIVE_UPDATES). Le scritture sulle prenotazioni pubblicano dopo il
+# commit un evento sul canale "<court_id>:<data>"; ogni client collegato allo
+# stream SSE (async_views.live_availability) ha una coda in memoria nel
+# processo ASGI. Il backend (settings.PUBSUB_BACKEND) decide come gli eventi
+# arrivano ai processi: LocalBroker solo nel processo corrente, PostgresBroker
+# a tutti i processi tramite LISTEN/NOTIFY.
+
+logger = logging.getLogger(__name__)
+
+# Eventi in coda per client: oltre questo limite il client riceve "resync"
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+# Segnaposto in coda: gli eventi persi vanno recuperati rileggendo gli orari
+RESYNC = None
+
+
+def live_updates_enabled():
+    return getattr(settings, "LIVE_UPDATES", False)
+
+
+# Iscrizione di un client a un canale. La coda appartiene all'event loop del
+# client; gli eventi possono arrivare da qualsiasi thread.
+class Subscription:
+    def __init__(self, broker, channel, loop, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # event loop chiuso: il client non c'è più
+            self.close()
+
+    def _put(self, message):
+        if self.queue.full():
+            # Client troppo lento: gli eventi in coda vengono sostituiti da un resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+# Backend nel processo corrente: adatto a un solo processo ASGI (o ai test)
+class LocalBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, channel, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), maxsize)
+        with self.lock:
+            self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.channel]
+
+    def subscribers(self, channel):
+        with self.lock:
+            return len(self.subscriptions.get(channel, ()))
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    # Consegna l'evento ai client di questo processo
+    def deliver(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+# Backend per più processi: gli eventi passano da NOTIFY di PostgreSQL e ogni
+# processo li riceve con una connessione dedicata in LISTEN (un thread in
+# background, avviato alla prima iscrizione)
+class PostgresBroker(LocalBroker):
+    pg_channel = "campoclick_live"
+    reconnect_delay = 5
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def subscribe(self, channel, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name="pubsub-listener", daemon=True)
+                self.listener.start()
+        return super().subscribe(channel, maxsize)
+
+    def publish(self, channel, message):
+        payload = json.dumps({"channel": channel, "message": message}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.pg_channel, payload])
+
+    def listen(self):
+        import psycopg
+
+        params = connection.get_connection_params()
+        while True:
+            try:
+                with psycopg.connect(**params, autocommit=True) as listener:
+                    listener.execute(f"LISTEN {self.pg_channel}")
+                    for notify in listener.notifies():
+                        data = json.loads(notify.payload)
+                        self.deliver(data["channel"], data["message"])
+            except Exception:
+                logger.exception("Connessione LISTEN interrotta, nuovo tentativo tra %ss", self.reconnect_delay)
+                time.sleep(self.reconnect_delay)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.PUBSUB_BACKEND)()
+
+
+# ********** EVENTI DEGLI SLOT **********
+
+
+def slot_channel(court_id, date):
+    return f"{court_id}:{date.isoformat()}"
+
+
+# Pubblica dopo il commit gli slot occupati e liberati, come coppie (schedule_id, data)
+def publish_slots(taken=(), freed=()):
+    events = [("slot_taken", slot) for slot in taken] + [("slot_freed", slot) for slot in freed]
+    events = [(event, slot) for event, slot in events if slot[0] is not None]
+    if not events:
+        return
+    schedules = {
+        pk: (court_id, time_slot)
+        for pk, court_id, time_slot in Schedule.objects.filter(
+            pk__in={schedule_id for _, (schedule_id, _) in events}
+        ).values_list("pk", "court_id", "time_slot")
+    }
+
+    messages = []
+    for event, (schedule_id, date) in events:
+        if schedule_id not in schedules:
+            continue
+        court_id, time_slot = schedules[schedule_id]
+        messages.append(
+            (
+                slot_channel(court_id, date),
+                {
+                    "event": event,
+                    "court_id": court_id,
+                    "schedule_id": schedule_id,
+                    "time_slot": time_slot,
+                    "date": date.isoformat(),
+                },
+            )
+        )
+
+    # La prenotazione è già confermata: un errore di pubblicazione (es: NOTIFY
+    # non riuscito) viene solo registrato, i client si riallineano con lo snapshot
+    def send():
+        broker = get_broker()
+        for channel, message in messages:
+            try:
+                broker.publish(channel, message)
+            except Exception:
+                logger.exception("Pubblicazione non riuscita sul canale %s", channel)
+
+    transaction.on_commit(send)
+
+
+# ********** SERVER-SENT EVENTS **********
+
+
+def format_event(event, data):
+    return b"event: " + event.encode() + b"\ndata: " + FastJSONRenderer().render(data) + b"\n\n"
+
+
+# Contenuto di una StreamingHttpResponse: gli eventi iniziali, poi quelli del
+# canale, con un commento ogni "heartbeat" secondi per tenere aperta la
+# connessione attraverso proxy e load balancer. close() (chiamato da Django a
+# fine risposta o alla disconnessione del client) cancella l'iscrizione.
+class EventStream:
+    def __init__(self, subscription, initial=(), heartbeat=15):
+        self.subscription = subscription
+        self.initial = initial
+        self.heartbeat = heartbeat
+
+    async def __aiter__(self):
+        try:
+            for event, data in self.initial:
+                yield format_event(event, data)
+            while True:
+                try:
+                    message = await self.subscription.get(self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if message is RESYNC:
+                    yield format_event("resync", {})
+                else:
+                    yield format_event(message["event"], message)
+        finally:
+            self.close()
+
+    def close(self):
+        self.subscription.close()
@@ -0,0 +1,73 @@
+from .models import Courts, Booking
+from .utils import parse_query_date, parse_query_int, parse_query_list
+
+# Filtri sui parametri di query condivisi dalle view sincrone e asincrone.
+# Gli errori vengono restituiti come messaggi: ogni view li trasforma in una risposta 400.
+
+INVALID_DATE_MESSAGE = "Data non valida, usare il formato YYYY-MM-DD."
+
+
+def filter_courts(sport):
+    # Se viene passato un parametro sport (es: "/courts?sport=tennis"), filtra i campi sportivi per court_type
+    if sport:
+        return Courts.objects.filter(
+            court_type__iexact=sport
+        )  # __iexact per non distinguere tra maiuscole e minuscole
+    return Courts.objects.all()
+
+
+# Restituisce (court_id, errore): court_id è None se il parametro non è presente
+def parse_court_id(params):
+    value = params.get("court_id", None)
+    if not value:
+        return None, None
+    court_id = parse_query_int(value)
+    if court_id is None:
+        return None, "court_id non valido."
+    return court_id, None
+
+
+# Restituisce (data, errore): data è None se il parametro non è presente
+def parse_date_param(params, name):
+    value = params.get(name, None)
+    if not value:
+        return None, None
+    date = parse_query_date(value)
+    if date is None:
+        return None, f"{name} non valido, usare il formato YYYY-MM-DD."
+    return date, None
+
+
+# Prenotazioni filtrate per intervallo di date, campo ed email: restituisce (queryset, errore)
+def filter_bookings(params):
+    bookings = Booking.objects.all()
+
+    for param, lookup in (("date_from", "booking_date__gte"), ("date_to", "booking_date__lte")):
+        date, error = parse_date_param(params, param)
+        if error:
+            return None, error
+        if date is not None:
+            bookings = bookings.filter(**{lookup: date})
+
+    court_id, error = parse_court_id(params)
+    if error:
+        return None, error
+    if court_id is not None:
+        bookings = bookings.filter(schedule__court_id=court_id)
+
+    email = params.get("email", None)
+    if email:
+        bookings = bookings.filter(email=email)
+
+    return bookings, None
+
+
+# Restringe un ValuesSerializer ai parametri ?fields= ed ?expand=: restituisce (serializer, errore)
+def select_fields(values_serializer, params):
+    try:
+        selected = values_serializer.select(
+            parse_query_list(params.get("fields")), parse_query_list(params.get("expand"))
+        )
+    except ValueError as e:
+        return None, f"Campo sconosciuto: {e}."
+    return selected, None
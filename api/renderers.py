@@ -0,0 +1,72 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson è opzionale: senza si usa il renderer standard di DRF
+    orjson = None
+
+
+# Renderer JSON basato su orjson. Produce gli stessi byte di JSONRenderer
+# (formato compatto, UTF-8, U+2028/U+2029 escapati) ma molto più velocemente.
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Con indentazione richiesta dal client si usa il renderer standard
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Date e orari passano dall'encoder di DRF, che tronca i microsecondi
+        content = orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Come JSONRenderer: U+2028 e U+2029 non sono validi in JavaScript
+        if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+            content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return content
+
+
+# Formato colonnare per le liste (?format=columnar o Accept
+# application/vnd.campoclick.columnar+json): {"columns": [...], "rows": [[...]]}
+# invece di una lista di oggetti, così i nomi dei campi compaiono una sola volta.
+# Nelle risposte paginate viene convertito solo "results"; le risposte che non
+# sono liste di oggetti restano invariate.
+class ColumnarJSONRenderer(FastJSONRenderer):
+    media_type = "application/vnd.campoclick.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columns(data), accepted_media_type, renderer_context)
+
+
+# Formati di esportazione (views.export_bookings): servono alla negoziazione del
+# contenuto (Accept: text/csv), perché il file viene prodotto in streaming dalla
+# view senza passare dal renderer. Le risposte di errore restano in JSON.
+class ExportRenderer(BaseRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = FastJSONRenderer.media_type
+        return FastJSONRenderer().render(data, renderer_context=renderer_context)
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+
+def to_columns(data):
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        return {**data, "results": to_columns(data["results"])}
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    columns = list(data[0]) if data else []
+    return {"columns": columns, "rows": [[row[column] for column in columns] for row in data]}
@@ -0,0 +1,258 @@
+import calendar
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from django.db.models.functions import Coalesce, Lower, TruncMonth, TruncWeek
+
+from .models import Schedule, Booking, BookingArchive, OccupancyRollup
+
+# Report di occupazione e incassi calcolati nel database con GROUP BY su
+# Booking ⋈ Schedule ⋈ Courts, per giorno, settimana, mese o orario.
+# Con OCCUPANCY_ROLLUP attivo i raggruppamenti per data leggono il riepilogo
+# giornaliero per campo (OccupancyRollup) invece delle prenotazioni; il
+# raggruppamento per orario usa sempre le prenotazioni, perché il riepilogo
+# non conserva il dettaglio degli orari. Il riepilogo viene ricalcolato da
+# "manage.py refresh_occupancy", mai durante le richieste. Le prenotazioni archiviate
+# (BookingArchive) vengono sommate a quelle della tabella principale.
+
+GROUPS = ("day", "week", "month", "time_slot")
+DIMENSIONS = ("court", "sport")
+
+# Ampiezza massima dell'intervallo di un report
+MAX_REPORT_DAYS = 366
+
+# Righe del riepilogo ricalcolate per transazione
+REFRESH_BATCH_SIZE = 1000
+
+
+def rollup_enabled():
+    return getattr(settings, "OCCUPANCY_ROLLUP", False)
+
+
+# ********** MANUTENZIONE DEL RIEPILOGO **********
+
+
+# Prenotazioni e prenotazioni archiviate: (queryset, campo, tipo di campo, orario, prezzo).
+# L'incasso è il prezzo pagato; le prenotazioni senza prezzo fissato usano quello dell'orario.
+def _sources():
+    return [
+        (
+            Booking.objects.all(),
+            "schedule__court_id",
+            "schedule__court__court_type",
+            "schedule__time_slot",
+            Coalesce("price_charged", "schedule__price"),
+        ),
+        # Le righe archiviate conservano campo e prezzo del momento dell'archiviazione
+        (BookingArchive.objects.all(), "court_id", "court_type", "time_slot", Coalesce("price_charged", "price")),
+    ]
+
+
+# Totali giornalieri per campo: {(court_id, data): (prenotazioni, incasso, tipo di campo)}.
+# Il tipo di campo è quello delle prenotazioni (o, se il campo non esiste più,
+# quello copiato nell'archivio): i report per sport non dipendono dal campo.
+def _daily_totals(court_ids=None, dates=None):
+    totals = {}
+    for bookings, court_field, type_field, _, price_field in _sources():
+        if court_ids is not None:
+            bookings = bookings.filter(**{f"{court_field}__in": court_ids})
+        if dates is not None:
+            bookings = bookings.filter(booking_date__in=dates)
+        rows = (
+            bookings.values(court_field, "booking_date", type_field)
+            .annotate(bookings=Count("pk"), revenue=Sum(price_field))
+            .order_by()
+        )
+        for row in rows:
+            key = (row[court_field], row["booking_date"])
+            count, revenue, court_type = totals.get(key, (0, Decimal(0), row[type_field]))
+            totals[key] = (count + row["bookings"], revenue + row["revenue"], court_type)
+    return totals
+
+
+# Marca da ricalcolare le righe (campo, data), creandole se mancano (upsert)
+def mark_stale(pairs):
+    pairs = {(court_id, date) for court_id, date in pairs if court_id is not None and date is not None}
+    if pairs:
+        OccupancyRollup.objects.bulk_create(
+            [OccupancyRollup(court_id=court_id, date=date, stale=True) for court_id, date in pairs],
+            update_conflicts=True,
+            unique_fields=["court", "date"],
+            update_fields=["stale"],
+        )
+
+
+# Come mark_stale, a partire dalle coppie (schedule_id, data) delle prenotazioni
+def mark_stale_slots(slots):
+    slots = {(schedule_id, date) for schedule_id, date in slots if schedule_id is not None}
+    courts = dict(
+        Schedule.objects.filter(pk__in={schedule_id for schedule_id, _ in slots}).values_list("pk", "court_id")
+    )
+    mark_stale((courts.get(schedule_id), date) for schedule_id, date in slots)
+
+
+def mark_stale_courts(*court_ids):
+    OccupancyRollup.objects.filter(court_id__in=[pk for pk in court_ids if pk is not None]).update(stale=True)
+
+
+# Ricalcola le righe stale a blocchi. Le righe vengono bloccate: una prenotazione
+# concorrente attende il commit e poi le marca di nuovo, quindi nessuna modifica
+# va persa. Restituisce il numero di righe ricalcolate.
+def refresh_rollups():
+    refreshed = 0
+    while True:
+        with transaction.atomic():
+            stale = list(
+                OccupancyRollup.objects.select_for_update()
+                .filter(stale=True)
+                .values_list("pk", "court_id", "date")[:REFRESH_BATCH_SIZE]
+            )
+            if not stale:
+                return refreshed
+            totals = _daily_totals(
+                court_ids={court_id for _, court_id, _ in stale},
+                dates={date for _, _, date in stale},
+            )
+
+            updated = []
+            empty = []
+            for pk, court_id, date in stale:
+                if (court_id, date) in totals:
+                    bookings, revenue, court_type = totals[court_id, date]
+                    updated.append(
+                        OccupancyRollup(
+                            pk=pk, bookings=bookings, revenue=revenue, court_type=court_type, stale=False
+                        )
+                    )
+                else:
+                    empty.append(pk)
+            OccupancyRollup.objects.bulk_update(updated, ["bookings", "revenue", "court_type", "stale"])
+            OccupancyRollup.objects.filter(pk__in=empty).delete()
+            refreshed += len(stale)
+
+
+# Ricostruisce da zero il riepilogo (prima attivazione o dopo import massivi)
+def rebuild_rollups():
+    with transaction.atomic():
+        OccupancyRollup.objects.all().delete()
+        totals = _daily_totals()
+        # Le righe già marcate da scritture concorrenti restano stale
+        OccupancyRollup.objects.bulk_create(
+            [
+                OccupancyRollup(
+                    court_id=court_id, date=date, bookings=bookings, revenue=revenue, court_type=court_type
+                )
+                for (court_id, date), (bookings, revenue, court_type) in totals.items()
+            ],
+            batch_size=REFRESH_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    return len(totals)
+
+
+# ********** REPORT **********
+
+
+# Giorni del periodo che iniziano in "period" compresi nell'intervallo [start, end]
+def _days_in_period(period, group, start, end):
+    if group == "week":
+        last = period + datetime.timedelta(days=6)
+    elif group == "month":
+        last = period.replace(day=calendar.monthrange(period.year, period.month)[1])
+    else:
+        last = period
+    return (min(last, end) - max(period, start)).days + 1
+
+
+def occupancy_report(start, end, group="day", by="court", court_id=None, sport=None):
+    booking_sources = [
+        (
+            bookings,
+            "booking_date",
+            court_field,
+            type_field,
+            slot_field,
+            {"bookings": Count("pk"), "revenue": Sum(price_field)},
+        )
+        for bookings, court_field, type_field, slot_field, price_field in _sources()
+    ]
+
+    if rollup_enabled() and group != "time_slot":
+        # Il riepilogo viene solo letto, senza lock: lo aggiorna il comando
+        # refresh_occupancy. I giorni ancora da ricalcolare (stale) vengono
+        # sommati direttamente dalle prenotazioni.
+        sources = [
+            (
+                OccupancyRollup.objects.filter(bookings__gt=0, stale=False),
+                "date",
+                "court_id",
+                "court_type",
+                None,
+                {"bookings": Sum("bookings"), "revenue": Sum("revenue")},
+            )
+        ]
+        for bookings, date_field, court_field, type_field, slot_field, aggregates in booking_sources:
+            stale = OccupancyRollup.objects.filter(stale=True, court_id=OuterRef(court_field), date=OuterRef(date_field))
+            sources.append((bookings.filter(Exists(stale)), date_field, court_field, type_field, slot_field, aggregates))
+    else:
+        sources = booking_sources
+
+    schedules = Schedule.objects.all()
+    if court_id:
+        schedules = schedules.filter(court_id=court_id)
+    if sport:
+        schedules = schedules.filter(court__court_type__iexact=sport)
+
+    # Totali per (periodo, chiave), sommati tra prenotazioni e archivio
+    merged = {}
+    for rows, date_field, court_field, type_field, slot_field, totals in sources:
+        rows = rows.filter(**{f"{date_field}__range": (start, end)})
+        if court_id:
+            rows = rows.filter(**{court_field: court_id})
+        if sport:
+            rows = rows.filter(**{f"{type_field}__iexact": sport})
+
+        if group == "time_slot":
+            period_of = F(slot_field)
+        else:
+            period_of = {"day": F(date_field), "week": TruncWeek(date_field), "month": TruncMonth(date_field)}[group]
+        key = F(court_field) if by == "court" else Lower(type_field)
+        grouped = rows.annotate(period=period_of, key=key).values("period", "key").annotate(**totals).order_by()
+        for row in grouped:
+            period = row["period"]
+            if isinstance(period, datetime.datetime):
+                period = period.date()
+            bookings, revenue = merged.get((period, row["key"]), (0, Decimal(0)))
+            merged[period, row["key"]] = (bookings + row["bookings"], revenue + (row["revenue"] or 0))
+
+    # Capacità: orari esistenti per chiave (e per orario) moltiplicati per i giorni
+    schedule_key = F("court_id") if by == "court" else Lower("court__court_type")
+    slots_per_key = schedules.annotate(key=schedule_key)
+    if group == "time_slot":
+        slots_per_key = slots_per_key.values("key", "time_slot").annotate(slots=Count("pk"))
+        slots = {(row["time_slot"], row["key"]): row["slots"] for row in slots_per_key}
+    else:
+        slots_per_key = slots_per_key.values("key").annotate(slots=Count("pk"))
+        slots = {row["key"]: row["slots"] for row in slots_per_key}
+
+    total_days = (end - start).days + 1
+    report = []
+    for (period, key), (bookings, revenue) in sorted(merged.items()):
+        if group == "time_slot":
+            capacity = slots.get((period, key), 0) * total_days
+        else:
+            capacity = slots.get(key, 0) * _days_in_period(period, group, start, end)
+        report.append(
+            {
+                "period": period if group == "time_slot" else period.isoformat(),
+                "court_id" if by == "court" else "sport": key,
+                "bookings": bookings,
+                "capacity": capacity,
+                "occupancy": round(bookings / capacity, 4) if capacity else None,
+                "revenue": str(Decimal(revenue).quantize(Decimal("0.01"))),
+            }
+        )
+    return report
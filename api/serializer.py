@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Courts, Schedule, Booking
+from .archive import retention_cutoff
+from .models import Courts, Schedule, Booking, BookingArchive
 
 # Il serializer permette di convertire i dati dei modelli in formato JSON
 
@@ -18,6 +19,27 @@ class ScheduleSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+# Campi del campo sportivo aggiunti agli orari con ?expand=court
+class ScheduleCourtSerializer(serializers.ModelSerializer):
+    court_name = serializers.CharField(source='court.court_name', read_only=True)
+    court_type = serializers.CharField(source='court.court_type', read_only=True)
+
+    class Meta:
+        model = Schedule
+        fields = ["court_name", "court_type"]
+
+
+# Le date oltre la finestra di conservazione sono nell'archivio: una nuova
+# prenotazione non verrebbe confrontata con quelle archiviate
+def validate_retained_date(value):
+    cutoff = retention_cutoff()
+    if value < cutoff:
+        raise serializers.ValidationError(
+            f"Le prenotazioni precedenti al {cutoff.isoformat()} sono archiviate e non modificabili."
+        )
+    return value
+
+
 # Serializer per il modello Bookings
 class BookingSerializer(serializers.ModelSerializer):
     court_name = serializers.CharField(source='schedule.court.court_name', read_only=True)
@@ -27,4 +49,59 @@ class BookingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Booking
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+        # Il prezzo viene fissato dal servizio di prenotazione (api/pricing.py)
+        read_only_fields = ["price_charged"]
+        # Lo slot libero viene verificato dal servizio di prenotazione con un lock
+        # sulla riga, così i conflitti restituiscono 409 invece di un errore di validazione
+        validators = []
+
+    def validate_booking_date(self, value):
+        return validate_retained_date(value)
+
+
+# Prenotazioni archiviate, con le stesse chiavi di BookingSerializer
+class BookingArchiveSerializer(serializers.ModelSerializer):
+    booking_time = serializers.CharField(source='time_slot', read_only=True)
+    schedule = serializers.IntegerField(source='schedule_id', read_only=True)
+
+    class Meta:
+        model = BookingArchive
+        fields = [
+            "booking_id",
+            "court_name",
+            "court_type",
+            "court_image_url",
+            "booking_time",
+            "booking_date",
+            "name",
+            "surname",
+            "email",
+            "phone",
+            "booking_datetime",
+            "price_charged",
+            "schedule",
+        ]
+
+
+# Serializer per gli inserimenti multipli: i riferimenti sono semplici id, risolti
+# con una sola query dal servizio invece di una query per ogni elemento
+class BulkScheduleSerializer(serializers.ModelSerializer):
+    court = serializers.IntegerField()
+
+    class Meta:
+        model = Schedule
+        fields = ["court", "time_slot", "price"]
+        validators = []
+
+
+class BulkBookingSerializer(serializers.ModelSerializer):
+    schedule = serializers.IntegerField()
+
+    class Meta:
+        model = Booking
+        fields = ["schedule", "booking_date", "name", "surname", "email", "phone"]
+        validators = []
+
+    def validate_booking_date(self, value):
+        return validate_retained_date(value)
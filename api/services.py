@@ -0,0 +1,348 @@
+import datetime
+import hashlib
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from . import inventory, pricing, pubsub, reports
+from .archive import archive_bookings, delete_bookings
+from .availability import booked_slots, is_slot_available
+from .cache import invalidate_courts, touch_tables
+from .models import Courts, Schedule, Booking, IdempotencyKey
+from .serializer import (
+    BookingSerializer,
+    BulkBookingSerializer,
+    BulkScheduleSerializer,
+    ScheduleSerializer,
+)
+
+# Servizio transazionale per la creazione e la modifica delle prenotazioni.
+# Lo slot viene bloccato con select_for_update sulla riga Schedule: le richieste
+# concorrenti sullo stesso orario vengono serializzate e solo la prima va a buon fine.
+
+ServiceResult = namedtuple("ServiceResult", ["status", "data", "replayed"], defaults=[False])
+
+CONFLICT_MESSAGE = "Questo slot orario non è disponibile per la data selezionata."
+KEY_REUSED_MESSAGE = "Idempotency-Key già usata per una richiesta diversa."
+KEY_TOO_LONG_MESSAGE = "Idempotency-Key troppo lunga (massimo {} caratteri)."
+DUPLICATE_MESSAGE = "Elemento duplicato all'interno della richiesta."
+
+# Numero massimo di elementi accettati da un inserimento multiplo
+BULK_MAX_ITEMS = 500
+
+
+# Le chiavi create prima di questo istante sono scadute
+def idempotency_cutoff():
+    return timezone.now() - datetime.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def _fingerprint(data):
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Valida i dati, blocca lo slot e salva la prenotazione (nuova o esistente)
+def _save_booking(serializer, exclude_booking=None):
+    if not serializer.is_valid():
+        return ServiceResult(status.HTTP_400_BAD_REQUEST, serializer.errors)
+    # In un savepoint: se l'inserimento fallisce anche lo slot occupato
+    # nell'inventario torna libero, senza annullare il resto della transazione
+    with transaction.atomic():
+        return _reserve_and_save(serializer, exclude_booking)
+
+
+def _reserve_and_save(serializer, exclude_booking):
+    schedule = serializer.validated_data.get("schedule", getattr(serializer.instance, "schedule", None))
+    booking_date = serializer.validated_data.get(
+        "booking_date", getattr(serializer.instance, "booking_date", None)
+    )
+
+    # Con l'inventario attivo lo slot viene occupato con un UPDATE condizionale
+    # (lo stesso slot di una prenotazione modificata è già occupato da lei)
+    instance = serializer.instance
+    current = (instance.schedule_id, instance.booking_date) if instance else None
+    reserved = None
+    if (schedule.pk, booking_date) != current and inventory.covers(booking_date):
+        reserved = inventory.reserve(schedule.pk, booking_date)
+        if reserved is False:
+            return ServiceResult(status.HTTP_409_CONFLICT, {"error": CONFLICT_MESSAGE})
+
+    if reserved:
+        # Il campo serve alla risposta del serializer
+        serializer.validated_data["schedule"] = pricing.with_rules_flag(
+            Schedule.objects.select_related("court")
+        ).get(pk=schedule.pk)
+    else:
+        # Blocca la riga dello slot fino alla fine della transazione; il campo viene
+        # caricato nella stessa query perché serve alla risposta del serializer, insieme
+        # alla presenza di regole di prezzo
+        serializer.validated_data["schedule"] = pricing.with_rules_flag(
+            Schedule.objects.select_for_update(of=("self",)).select_related("court")
+        ).get(pk=schedule.pk)
+        if not is_slot_available(schedule.pk, booking_date, exclude_booking=exclude_booking):
+            return ServiceResult(status.HTTP_409_CONFLICT, {"error": CONFLICT_MESSAGE})
+
+    # Il prezzo effettivo viene fissato alla prenotazione e ricalcolato solo se cambia lo slot
+    extra = {}
+    if (schedule.pk, booking_date) != current:
+        extra["price_charged"] = pricing.effective_price(serializer.validated_data["schedule"], booking_date)
+
+    try:
+        # Il vincolo unique_together resta l'ultima difesa (es: database senza lock di riga)
+        with transaction.atomic():
+            serializer.save(**extra)
+    except IntegrityError:
+        transaction.set_rollback(True)
+        return ServiceResult(status.HTTP_409_CONFLICT, {"error": CONFLICT_MESSAGE})
+
+    code = status.HTTP_200_OK if exclude_booking else status.HTTP_201_CREATED
+    return ServiceResult(code, serializer.data)
+
+
+# Crea una prenotazione. Con una idempotency_key la risposta viene salvata nella
+# stessa transazione: le richieste ripetute ricevono la risposta originale.
+def create_booking(data, idempotency_key=None):
+    max_length = IdempotencyKey._meta.get_field("key").max_length
+    if idempotency_key and len(idempotency_key) > max_length:
+        return ServiceResult(status.HTTP_400_BAD_REQUEST, {"error": KEY_TOO_LONG_MESSAGE.format(max_length)})
+
+    with transaction.atomic():
+        record = None
+        if idempotency_key:
+            fingerprint = _fingerprint(data)
+            # Una richiesta concorrente con la stessa chiave attende qui il commit della prima
+            record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+                key=idempotency_key, defaults={"fingerprint": fingerprint}
+            )
+            if not created and record.created_at < idempotency_cutoff():
+                # Chiave scaduta (non ancora eliminata): vale come nuova
+                record.fingerprint = fingerprint
+                record.status_code = record.response = None
+                record.created_at = timezone.now()
+                record.save()
+                created = True
+            if record.fingerprint != fingerprint:
+                return ServiceResult(
+                    status.HTTP_422_UNPROCESSABLE_ENTITY, {"error": KEY_REUSED_MESSAGE}
+                )
+            if not created and record.status_code is not None:
+                return ServiceResult(record.status_code, record.response, replayed=True)
+
+        result = _save_booking(BookingSerializer(data=data))
+
+        if record is not None:
+            record.status_code = result.status
+            record.response = result.data
+            record.save(update_fields=["status_code", "response"])
+
+        return result
+
+
+# Modifica una prenotazione esistente con le stesse garanzie della creazione
+def update_booking(booking, data):
+    with transaction.atomic():
+        return _save_booking(BookingSerializer(booking, data=data), exclude_booking=booking.pk)
+
+
+# ********** INSERIMENTI MULTIPLI **********
+
+
+# Valida i singoli elementi senza accedere al database.
+# Restituisce (dati validati, errori) con un dizionario di errori per elemento.
+def _validate_items(serializer_class, items):
+    if not isinstance(items, list) or not items:
+        return None, {"error": "È richiesta una lista non vuota di elementi."}
+    if len(items) > BULK_MAX_ITEMS:
+        return None, {"error": f"Sono ammessi al massimo {BULK_MAX_ITEMS} elementi."}
+
+    validated = []
+    errors = []
+    for item in items:
+        serializer = serializer_class(data=item)
+        if serializer.is_valid():
+            validated.append(serializer.validated_data)
+            errors.append({})
+        else:
+            validated.append(None)
+            errors.append(dict(serializer.errors))
+    return validated, errors
+
+
+def _bulk_error(errors, conflict):
+    code = status.HTTP_409_CONFLICT if conflict else status.HTTP_400_BAD_REQUEST
+    return ServiceResult(code, {"errors": errors})
+
+
+# Crea più prenotazioni in un'unica transazione: una query per gli slot (bloccati),
+# una per la disponibilità e un solo INSERT. Se un elemento non è valido non
+# viene salvato nulla e la risposta riporta gli errori per ogni elemento.
+def create_bookings(items):
+    validated, errors = _validate_items(BulkBookingSerializer, items)
+    if validated is None:
+        return ServiceResult(status.HTTP_400_BAD_REQUEST, errors)
+
+    with transaction.atomic():
+        schedule_ids = sorted({data["schedule"] for data in validated if data})
+        schedules = {
+            schedule.pk: schedule
+            for schedule in pricing.with_rules_flag(
+                Schedule.objects.select_for_update(of=("self",)).select_related("court")
+            )
+            .filter(pk__in=schedule_ids)
+            .order_by("pk")
+        }
+        taken = booked_slots(
+            (data["schedule"], data["booking_date"]) for data in validated if data
+        )
+
+        invalid = any(errors)
+        conflict = False
+        seen = set()
+        bookings = []
+        for index, data in enumerate(validated):
+            if data is None:
+                continue
+            slot = (data["schedule"], data["booking_date"])
+            if data["schedule"] not in schedules:
+                errors[index] = {"schedule": [f"Orario {data['schedule']} inesistente."]}
+                invalid = True
+            elif slot in taken or slot in seen:
+                errors[index] = {"error": CONFLICT_MESSAGE if slot in taken else DUPLICATE_MESSAGE}
+                conflict = True
+            else:
+                seen.add(slot)
+                bookings.append(Booking(**{**data, "schedule": schedules[data["schedule"]]}))
+
+        if invalid or conflict:
+            return _bulk_error(errors, conflict=conflict and not invalid)
+
+        prices = pricing.effective_prices((booking.schedule, booking.booking_date) for booking in bookings)
+        for booking in bookings:
+            booking.price_charged = prices[booking.schedule_id, booking.booking_date]
+
+        try:
+            with transaction.atomic():
+                Booking.objects.bulk_create(bookings)
+        except IntegrityError:
+            return ServiceResult(status.HTTP_409_CONFLICT, {"error": CONFLICT_MESSAGE})
+
+        # bulk_create non invia i segnali post_save: aggiorna inventario e cache a mano
+        if inventory.inventory_enabled():
+            inventory.sync_slots((booking.schedule_id, booking.booking_date) for booking in bookings)
+        if reports.rollup_enabled():
+            reports.mark_stale((booking.schedule.court_id, booking.booking_date) for booking in bookings)
+        if pubsub.live_updates_enabled():
+            pubsub.publish_slots(taken=[(booking.schedule_id, booking.booking_date) for booking in bookings])
+        invalidate_courts(*{booking.schedule.court_id for booking in bookings})
+        touch_tables("bookings")
+
+    return ServiceResult(status.HTTP_201_CREATED, BookingSerializer(bookings, many=True).data)
+
+
+# Crea più orari (es: il listino 9-18 di un nuovo campo) con un solo INSERT
+def create_schedules(items):
+    validated, errors = _validate_items(BulkScheduleSerializer, items)
+    if validated is None:
+        return ServiceResult(status.HTTP_400_BAD_REQUEST, errors)
+
+    with transaction.atomic():
+        court_ids = {data["court"] for data in validated if data}
+        existing_courts = set(Courts.objects.filter(pk__in=court_ids).values_list("pk", flat=True))
+        existing_slots = set(
+            Schedule.objects.filter(court_id__in=court_ids).values_list("court_id", "time_slot")
+        )
+
+        invalid = any(errors)
+        conflict = False
+        seen = set()
+        schedules = []
+        for index, data in enumerate(validated):
+            if data is None:
+                continue
+            slot = (data["court"], data["time_slot"])
+            if data["court"] not in existing_courts:
+                errors[index] = {"court": [f"Campo {data['court']} inesistente."]}
+                invalid = True
+            elif slot in existing_slots or slot in seen:
+                message = "Orario già presente per questo campo." if slot in existing_slots else DUPLICATE_MESSAGE
+                errors[index] = {"error": message}
+                conflict = True
+            else:
+                seen.add(slot)
+                schedules.append(
+                    Schedule(court_id=data["court"], time_slot=data["time_slot"], price=data["price"])
+                )
+
+        if invalid or conflict:
+            return _bulk_error(errors, conflict=conflict and not invalid)
+
+        try:
+            with transaction.atomic():
+                Schedule.objects.bulk_create(schedules)
+        except IntegrityError:
+            return ServiceResult(
+                status.HTTP_409_CONFLICT, {"error": "Orario già presente per questo campo."}
+            )
+
+        if inventory.inventory_enabled():
+            inventory.add_schedules(schedules)
+        invalidate_courts(*court_ids)
+        touch_tables("schedules")
+
+    return ServiceResult(status.HTTP_201_CREATED, ScheduleSerializer(schedules, many=True).data)
+
+
+# ********** CANCELLAZIONI **********
+
+DeleteResult = namedtuple("DeleteResult", ["deleted", "archived"])
+
+
+# Cancella (o archivia, se passate) le prenotazioni a blocchi in transazioni brevi
+def _purge_bookings(bookings, archive):
+    archived = 0
+    if archive:
+        archived = archive_bookings(bookings.filter(booking_date__lt=datetime.date.today()))
+    return delete_bookings(bookings), archived
+
+
+# Cancella un campo con orari e prenotazioni. Le prenotazioni vengono cancellate
+# a blocchi (vedi archive.py) invece di essere caricate in memoria dal collector
+# di Django; con archive=True quelle passate vengono spostate nell'archivio.
+def delete_court(court, archive=False):
+    bookings = Booking.objects.filter(schedule__court=court)
+    deleted, archived = _purge_bookings(bookings, archive)
+
+    with transaction.atomic():
+        # Con gli orari bloccati nessuna nuova prenotazione può arrivare fino al commit:
+        # si cancellano quelle create nel frattempo, poi il collector trova solo
+        # orari e righe di inventario (cancellate con una sola query)
+        list(Schedule.objects.select_for_update().filter(court=court).order_by("pk").values_list("pk"))
+        deleted += delete_bookings(bookings)
+        # Al ricalcolo restano solo i giorni con prenotazioni archiviate
+        if reports.rollup_enabled():
+            reports.mark_stale_courts(court.pk)
+        court.delete()
+
+    # I segnali di campo e orari invalidano la cache, non quelli delle prenotazioni
+    touch_tables("bookings")
+    return DeleteResult(deleted, archived)
+
+
+# Come delete_court, per un singolo orario
+def delete_schedule(schedule, archive=False):
+    bookings = Booking.objects.filter(schedule=schedule)
+    deleted, archived = _purge_bookings(bookings, archive)
+
+    with transaction.atomic():
+        list(Schedule.objects.select_for_update().filter(pk=schedule.pk).values_list("pk"))
+        deleted += delete_bookings(bookings)
+        if reports.rollup_enabled():
+            reports.mark_stale_courts(schedule.court_id)
+        schedule.delete()
+
+    touch_tables("bookings")
+    return DeleteResult(deleted, archived)
@@ -1,3 +1,1543 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import io
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from campoclick_be import settings_api
+from . import inventory, pricing, pubsub, services
+from .availability import availability_matrix, available_schedules, is_slot_available
+from .fastpath import ValuesSerializer
+from .metrics import registry
+from .middleware import PerformanceMiddleware
+from .models import (
+    Courts,
+    Schedule,
+    Booking,
+    BookingArchive,
+    IdempotencyKey,
+    OccupancyRollup,
+    PricingRule,
+    SlotInventory,
+)
+from .renderers import FastJSONRenderer
+from .reports import occupancy_report, rebuild_rollups, refresh_rollups
+from .serializer import CourtsSerializer, ScheduleSerializer, BookingSerializer
+from .throttling import BookingRateThrottle, LoadSheddingThrottle
+
+
+DATE = datetime.date(2030, 6, 3)
+
+
+# Crea un campo con la griglia completa di orari (9-18)
+def make_court(name="Campo", court_type="tennis", slots=None):
+    court = Courts.objects.create(
+        court_name=name, court_type=court_type, court_surface="terra"
+    )
+    for hour in slots or range(9, 19):
+        Schedule.objects.create(court=court, time_slot=hour, price=Decimal("20.00"))
+    return court
+
+
+# Ogni test parte con la cache vuota: il database viene ripristinato ma la cache locale no.
+# I test girano in un solo processo: la cache locale può restare attiva.
+@override_settings(SHARED_CACHE=True)
+class BaseTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+
+def booking_payload(schedule, date=DATE, email="mario@example.com"):
+    return {
+        "schedule": schedule.pk,
+        "booking_date": date.isoformat(),
+        "name": "Mario",
+        "surname": "Rossi",
+        "email": email,
+        "phone": "3331234567",
+    }
+
+
+def make_booking(schedule, date=DATE, email="mario@example.com"):
+    return Booking.objects.create(
+        schedule=schedule,
+        booking_date=date,
+        name="Mario",
+        surname="Rossi",
+        email=email,
+        phone="3331234567",
+    )
+
+
+class AvailabilityTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tennis = make_court("Centrale", "tennis")
+        self.padel = make_court("Padel 1", "padel")
+
+    def test_available_schedules_excludes_booked_slots(self):
+        booked = self.tennis.schedules.get(time_slot=10)
+        make_booking(booked)
+
+        free = available_schedules(DATE, court_id=self.tennis.pk)
+        self.assertEqual(free.count(), 9)
+        self.assertNotIn(booked, free)
+        # Lo slot resta libero negli altri giorni
+        self.assertIn(booked, available_schedules(DATE + datetime.timedelta(days=1)))
+
+    def test_sport_filter_is_case_insensitive(self):
+        free = available_schedules(DATE, sport="PADEL")
+        self.assertEqual({s.court_id for s in free}, {self.padel.pk})
+
+    def test_is_slot_available_ignores_excluded_booking(self):
+        schedule = self.tennis.schedules.get(time_slot=9)
+        booking = make_booking(schedule)
+        self.assertFalse(schedule.is_available(DATE))
+        self.assertTrue(is_slot_available(schedule.pk, DATE, exclude_booking=booking.pk))
+
+    def test_get_schedules_filters_by_date(self):
+        make_booking(self.padel.schedules.get(time_slot=18))
+        response = self.client.get(
+            reverse("get_schedules"), {"date": DATE.isoformat(), "sport": "padel"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(s["time_slot"] for s in response.data), list(range(9, 18)))
+
+    def test_get_schedules_rejects_invalid_date(self):
+        response = self.client.get(reverse("get_schedules"), {"date": "2030-02-30"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_schedules_query_count_is_constant(self):
+        url = reverse("get_schedules")
+
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, {"date": DATE.isoformat()})
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        baseline = count_queries()
+        for i in range(20):
+            court = make_court(f"Extra {i}")
+            make_booking(court.schedules.get(time_slot=12))
+        self.assertEqual(count_queries(), baseline)
+
+
+class AvailabilityMatrixTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis")
+        self.small = make_court("Calcetto", "calcio", slots=[9, 10])
+
+    def test_matrix_clears_booked_bits(self):
+        make_booking(self.court.schedules.get(time_slot=9))
+        make_booking(self.court.schedules.get(time_slot=18), date=DATE + datetime.timedelta(days=2))
+
+        matrix = availability_matrix(DATE, DATE + datetime.timedelta(days=2))
+        full = (1 << 10) - 1
+        self.assertEqual(matrix[self.court.pk], [full & ~1, full, full & ~(1 << 9)])
+        self.assertEqual(matrix[self.small.pk], [0b11, 0b11, 0b11])
+
+    def test_matrix_uses_fixed_number_of_queries(self):
+        for i in range(10):
+            court = make_court(f"Extra {i}")
+            make_booking(court.schedules.get(time_slot=11))
+        with self.assertNumQueries(2):
+            availability_matrix(DATE, DATE + datetime.timedelta(days=13))
+
+    def test_endpoint_filters_by_sport(self):
+        response = self.client.get(
+            reverse("get_availability"),
+            {"start": DATE.isoformat(), "end": DATE.isoformat(), "sport": "calcio"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["slots"], list(range(9, 19)))
+        self.assertEqual(response.data["courts"], {self.small.pk: [0b11]})
+
+    def test_endpoint_validates_range(self):
+        url = reverse("get_availability")
+        self.assertEqual(self.client.get(url, {"start": DATE.isoformat()}).status_code, 400)
+        backwards = {"start": DATE.isoformat(), "end": (DATE - datetime.timedelta(days=1)).isoformat()}
+        self.assertEqual(self.client.get(url, backwards).status_code, 400)
+        too_long = {"start": DATE.isoformat(), "end": (DATE + datetime.timedelta(days=365)).isoformat()}
+        self.assertEqual(self.client.get(url, too_long).status_code, 400)
+
+
+class AvailabilityCacheTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis")
+        self.other = make_court("Laterale", "tennis")
+
+    def get_schedules(self, **params):
+        response = self.client.get(reverse("get_schedules"), {"date": DATE.isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_warm_reads_skip_the_database(self):
+        self.client.get(reverse("get_courts"))
+        self.get_schedules()
+        self.get_schedules(court_id=self.court.pk)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("get_courts"))
+            self.get_schedules()
+            self.get_schedules(court_id=self.court.pk)
+
+    def test_booking_invalidates_only_its_court(self):
+        self.assertEqual(len(self.get_schedules()), 20)
+        make_booking(self.court.schedules.get(time_slot=9))
+
+        # Il campo prenotato va ricalcolato (una query), l'altro resta in cache
+        with self.assertNumQueries(1):
+            data = self.get_schedules()
+        self.assertEqual(len(data), 19)
+
+    def test_moving_a_booking_invalidates_both_courts(self):
+        booking = make_booking(self.court.schedules.get(time_slot=9))
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 9)
+        self.assertEqual(len(self.get_schedules(court_id=self.other.pk)), 10)
+
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.schedule = self.other.schedules.get(time_slot=9)
+        booking.save()
+
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 10)
+        self.assertEqual(len(self.get_schedules(court_id=self.other.pk)), 9)
+
+    def test_deleting_a_booking_frees_the_slot(self):
+        booking = make_booking(self.court.schedules.get(time_slot=9))
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 9)
+        booking.delete()
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 10)
+
+    def test_court_changes_refresh_listing(self):
+        self.assertEqual(len(self.client.get(reverse("get_courts"), {"sport": "padel"}).data), 0)
+        self.other.court_type = "padel"
+        self.other.save()
+        self.assertEqual(len(self.client.get(reverse("get_courts"), {"sport": "padel"}).data), 1)
+        self.assertEqual(len(self.get_schedules(sport="padel")), 10)
+
+    def test_schedule_changes_refresh_court(self):
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 10)
+        self.court.schedules.get(time_slot=18).delete()
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 9)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_process_local_cache_is_not_used(self):
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 10)
+        # Scrittura senza segnali, come quella di un altro worker: nessun dato vecchio in cache
+        booking = Booking(
+            schedule=self.court.schedules.get(time_slot=9),
+            booking_date=DATE,
+            name="Mario",
+            surname="Rossi",
+            email="mario@example.com",
+            phone="3331234567",
+        )
+        Booking.objects.bulk_create([booking])
+        self.assertEqual(len(self.get_schedules(court_id=self.court.pk)), 9)
+
+
+class BookingServiceTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court()
+        self.schedule = self.court.schedules.get(time_slot=9)
+        self.url = reverse("create_booking")
+
+    def test_taken_slot_returns_conflict(self):
+        make_booking(self.schedule)
+        response = self.client.post(self.url, booking_payload(self.schedule), format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_invalid_payload_returns_bad_request(self):
+        payload = booking_payload(self.schedule)
+        del payload["email"]
+        response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("email", response.data)
+
+    def test_idempotency_key_replays_original_response(self):
+        headers = {"Idempotency-Key": "retry-1"}
+        first = self.client.post(self.url, booking_payload(self.schedule), format="json", headers=headers)
+        second = self.client.post(self.url, booking_payload(self.schedule), format="json", headers=headers)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_idempotency_key_reused_with_different_payload(self):
+        headers = {"Idempotency-Key": "retry-2"}
+        self.client.post(self.url, booking_payload(self.schedule), format="json", headers=headers)
+        other = booking_payload(self.court.schedules.get(time_slot=10))
+        response = self.client.post(self.url, other, format="json", headers=headers)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_idempotency_key_too_long_returns_bad_request(self):
+        headers = {"Idempotency-Key": "k" * 256}
+        response = self.client.post(self.url, booking_payload(self.schedule), format="json", headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_expired_idempotency_key_counts_as_new(self):
+        headers = {"Idempotency-Key": "retry-3"}
+        self.client.post(self.url, booking_payload(self.schedule), format="json", headers=headers)
+        expired = timezone.now() - datetime.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS + 1)
+        IdempotencyKey.objects.filter(key="retry-3").update(created_at=expired)
+
+        other = booking_payload(self.court.schedules.get(time_slot=10))
+        response = self.client.post(self.url, other, format="json", headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", response.headers)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_prune_idempotency_keys_deletes_expired_keys(self):
+        IdempotencyKey.objects.create(key="old", fingerprint="x")
+        IdempotencyKey.objects.create(key="new", fingerprint="x")
+        expired = timezone.now() - datetime.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS + 1)
+        IdempotencyKey.objects.filter(key="old").update(created_at=expired)
+
+        call_command("prune_idempotency_keys", stdout=io.StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["new"])
+
+    def test_moving_booking_to_taken_slot_returns_conflict(self):
+        taken = self.court.schedules.get(time_slot=10)
+        make_booking(taken)
+        booking = make_booking(self.schedule)
+
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        url = reverse("booking_detail", args=[booking.pk])
+        response = self.client.put(url, booking_payload(taken), format="json")
+        self.assertEqual(response.status_code, 409)
+        # Lasciare la prenotazione sul proprio slot non è un conflitto
+        response = self.client.put(url, booking_payload(self.schedule, email="nuova@example.com"), format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["email"], "nuova@example.com")
+
+
+class BulkCreateTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        self.court = make_court(slots=[9])
+        self.schedule = self.court.schedules.get()
+
+    def weekly_payload(self, weeks):
+        return [
+            booking_payload(self.schedule, date=DATE + datetime.timedelta(weeks=week))
+            for week in range(weeks)
+        ]
+
+    def test_bulk_bookings_use_fixed_number_of_queries(self):
+        url = reverse("create_bookings_bulk")
+        # Stesso numero di query per 5 o 50 prenotazioni (lock, disponibilità, insert)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.post(url, self.weekly_payload(5), format="json")
+        self.assertEqual(response.status_code, 201)
+        Booking.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(url, self.weekly_payload(50), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Booking.objects.count(), 50)
+        self.assertEqual(response.data[0]["court_name"], self.court.court_name)
+
+    def test_bulk_bookings_report_errors_per_item(self):
+        make_booking(self.schedule, date=DATE + datetime.timedelta(weeks=1))
+        payload = self.weekly_payload(3)
+        payload[2]["email"] = "non-una-email"
+
+        response = self.client.post(reverse("create_bookings_bulk"), payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["errors"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("error", errors[1])
+        self.assertIn("email", errors[2])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_bulk_bookings_conflicts_return_409(self):
+        payload = self.weekly_payload(2) + [booking_payload(self.schedule)]
+        response = self.client.post(reverse("create_bookings_bulk"), payload, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["errors"][2], {"error": "Elemento duplicato all'interno della richiesta."})
+        self.assertFalse(Booking.objects.exists())
+
+    def test_bulk_bookings_invalidate_cache(self):
+        url = reverse("get_schedules")
+        self.assertEqual(len(self.client.get(url, {"date": DATE.isoformat()}).data), 1)
+        self.client.post(reverse("create_bookings_bulk"), self.weekly_payload(1), format="json")
+        self.assertEqual(len(self.client.get(url, {"date": DATE.isoformat()}).data), 0)
+
+    def test_bulk_schedules(self):
+        court = Courts.objects.create(court_name="Nuovo", court_type="padel", court_surface="erba")
+        payload = [{"court": court.pk, "time_slot": hour, "price": "25.00"} for hour in range(9, 19)]
+        response = self.client.post(reverse("create_schedules_bulk"), payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(court.schedules.count(), 10)
+        self.assertEqual(response.data[0]["court"], court.pk)
+
+        response = self.client.post(reverse("create_schedules_bulk"), payload[:1], format="json")
+        self.assertEqual(response.status_code, 409)
+
+    def test_bulk_requires_a_list(self):
+        response = self.client.post(reverse("create_schedules_bulk"), {"court": 1}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingPaginationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale")
+        self.other = make_court("Laterale", slots=[9])
+        for day in range(5):
+            for schedule in self.court.schedules.all()[:5]:
+                make_booking(schedule, date=DATE + datetime.timedelta(days=day))
+        make_booking(self.other.schedules.get(), email="luca@example.com")
+
+    def collect(self, **params):
+        url = reverse("get_bookings")
+        results = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            results += response.data["results"]
+            if not response.data["next"]:
+                return results
+            response = self.client.get(response.data["next"])
+
+    def test_walks_all_pages_in_order(self):
+        results = self.collect(page_size=4)
+        self.assertEqual(len(results), 26)
+        self.assertEqual(len({row["booking_id"] for row in results}), 26)
+        keys = [(row["booking_date"], row["booking_datetime"], row["booking_id"]) for row in results]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_filters(self):
+        self.assertEqual(len(self.collect(court_id=self.other.pk)), 1)
+        self.assertEqual(len(self.collect(email="luca@example.com")), 1)
+        dates = {"date_from": (DATE + datetime.timedelta(days=1)).isoformat(),
+                 "date_to": (DATE + datetime.timedelta(days=2)).isoformat()}
+        self.assertEqual(len(self.collect(**dates)), 10)
+
+    def test_invalid_parameters(self):
+        url = reverse("get_bookings")
+        self.assertEqual(self.client.get(url, {"cursor": "non-valido"}).status_code, 404)
+        # Cursore manomesso: data e ora valide ma booking_id non è un UUID
+        for booking_id in ("x", 1):
+            position = json.dumps(["2025-01-01", "2025-01-01T00:00:00Z", booking_id]).encode()
+            cursor = base64.urlsafe_b64encode(position).decode()
+            self.assertEqual(self.client.get(url, {"cursor": cursor}).status_code, 404)
+        self.assertEqual(self.client.get(url, {"date_from": "ieri"}).status_code, 400)
+
+
+class BookingQueryCountTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.courts = [make_court(f"Campo {i}") for i in range(4)]
+
+    def add_bookings(self, count):
+        schedules = Schedule.objects.order_by("pk")[:count]
+        for schedule in schedules:
+            make_booking(schedule)
+
+    def test_list_query_count_does_not_grow(self):
+        url = reverse("get_bookings")
+        for count in (1, 10, 40):
+            Booking.objects.all().delete()
+            self.add_bookings(count)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(len(response.data["results"]), count)
+            self.assertTrue(all(row["court_name"] for row in response.data["results"]))
+
+    def test_detail_uses_one_query(self):
+        booking = make_booking(self.courts[0].schedules.get(time_slot=9))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("booking_detail", args=[booking.pk]))
+        self.assertEqual(response.data["court_name"], "Campo 0")
+
+    def test_create_loads_court_with_the_lock(self):
+        schedule = self.courts[0].schedules.get(time_slot=9)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse("create_booking"), booking_payload(schedule), format="json")
+        self.assertEqual(response.data["court_name"], "Campo 0")
+        # Validazione dello slot, lock con join sul campo, verifica disponibilità, insert
+        statements = [q["sql"] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 4)
+
+    def test_admin_changelist_query_count_does_not_grow(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "pwd"))
+        url = reverse("admin:api_booking_changelist")
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.add_bookings(2)
+        baseline = count_queries()
+        Booking.objects.all().delete()
+        self.add_bookings(30)
+        self.assertEqual(count_queries(), baseline)
+
+
+class FastSerializationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        court = make_court("Campo \u2028 Città", "tennis")
+        court.image_url = "https://example.com/campo.png"
+        court.save()
+        other = make_court("Calcetto", "calcio", slots=[9])
+        make_booking(court.schedules.get(time_slot=9))
+        make_booking(other.schedules.get(), email="àèì@example.com")
+
+    def assertSameBytes(self, serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        actual = FastJSONRenderer().render(ValuesSerializer(serializer_class).rows(queryset))
+        self.assertEqual(actual, expected)
+
+    def test_output_matches_model_serializers(self):
+        self.assertSameBytes(CourtsSerializer, Courts.objects.order_by("pk"))
+        self.assertSameBytes(ScheduleSerializer, Schedule.objects.order_by("pk"))
+        self.assertSameBytes(BookingSerializer, Booking.objects.order_by("booking_date", "pk"))
+
+    def test_renderer_matches_json_renderer(self):
+        data = {"courts": {1: [1023, 0]}, "price": Decimal("12.50"), "when": Booking.objects.first().booking_datetime}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_list_endpoints_use_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("get_bookings"))
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class ConditionalGetTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale")
+
+    def revalidate(self, url, params=None):
+        first = self.client.get(url, params)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+        with self.assertNumQueries(0):
+            second = self.client.get(url, params, headers={"If-None-Match": etag})
+        return etag, second
+
+    def test_unchanged_resources_return_304(self):
+        schedule = self.court.schedules.get(time_slot=9)
+        for url in (
+            reverse("get_courts"),
+            reverse("court_detail", args=[self.court.pk]),
+            reverse("get_schedules"),
+            reverse("schedule_detail", args=[schedule.pk]),
+        ):
+            _, response = self.revalidate(url)
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_only_etags_are_used(self):
+        # Last-Modified al secondo non distinguerebbe due scritture nello stesso secondo
+        response = self.client.get(reverse("get_courts"))
+        self.assertNotIn("Last-Modified", response.headers)
+
+    def test_writes_ignore_preconditions(self):
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        url = reverse("court_detail", args=[self.court.pk])
+        payload = {"court_name": "Centrale", "court_type": "tennis", "court_surface": "erba"}
+        response = self.client.put(url, payload, format="json", headers={"If-Match": '"altro"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_disabled_with_a_process_local_cache(self):
+        response = self.client.get(reverse("get_courts"))
+        self.assertNotIn("ETag", response.headers)
+        response = self.client.get(reverse("get_courts"), headers={"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_change_the_etag(self):
+        url = reverse("court_detail", args=[self.court.pk])
+        etag, _ = self.revalidate(url)
+        self.court.court_name = "Centrale rinnovato"
+        self.court.save()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["court_name"], "Centrale rinnovato")
+
+    def test_expanded_court_changes_the_schedule_etag(self):
+        url = reverse("schedule_detail", args=[self.court.schedules.get(time_slot=9).pk])
+        etag, _ = self.revalidate(url, {"expand": "court"})
+        self.court.court_name = "Centrale rinnovato"
+        self.court.save()
+        response = self.client.get(url, {"expand": "court"}, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["court_name"], "Centrale rinnovato")
+
+    def test_bookings_change_schedules_for_a_date(self):
+        url = reverse("get_schedules")
+        params = {"date": DATE.isoformat()}
+        etag, response = self.revalidate(url, params)
+        self.assertEqual(response.status_code, 304)
+        make_booking(self.court.schedules.get(time_slot=9))
+        response = self.client.get(url, params, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 9)
+
+    def test_filters_have_distinct_etags(self):
+        url = reverse("get_courts")
+        self.assertNotEqual(
+            self.client.get(url).headers["ETag"],
+            self.client.get(url, {"sport": "tennis"}).headers["ETag"],
+        )
+
+
+class AsyncViewTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis")
+        make_court("Calcetto", "calcio", slots=[9, 10])
+        make_booking(self.court.schedules.get(time_slot=9))
+
+    async def test_read_endpoints_match_sync_views(self):
+        cases = [
+            ("get_courts", {"sport": "tennis"}),
+            ("get_schedules", {"date": DATE.isoformat()}),
+            ("get_schedules", {"court_id": self.court.pk}),
+            ("get_bookings", {"page_size": 1}),
+        ]
+        for name, params in cases:
+            await sync_to_async(cache.clear)()
+            expected = await sync_to_async(self.client.get)(reverse(name), params)
+            response = await self.async_client.get(reverse(f"async_{name}"), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, expected.content, name)
+
+    async def test_invalid_parameters(self):
+        response = await self.async_client.get(reverse("async_get_schedules"), {"date": "domani"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(reverse("async_get_bookings"), {"cursor": "x"})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_create_booking(self):
+        schedule = await self.court.schedules.aget(time_slot=10)
+        url = reverse("async_create_booking")
+        payload = json.dumps(booking_payload(schedule))
+        response = await self.async_client.post(url, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["court_name"], "Centrale")
+        response = await self.async_client.post(url, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+
+
+@override_settings(SLOT_INVENTORY=True)
+class SlotInventoryTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis")
+        self.schedule = self.court.schedules.get(time_slot=9)
+        self.booking = make_booking(self.schedule)
+        inventory.extend(7, today=DATE)
+
+    def slot(self, schedule, date=DATE):
+        return SlotInventory.objects.get(schedule=schedule, date=date)
+
+    def test_extend_marks_existing_bookings(self):
+        self.assertEqual(SlotInventory.objects.count(), 70)
+        self.assertTrue(self.slot(self.schedule).is_booked)
+        self.assertEqual(inventory.horizon(), (DATE, DATE + datetime.timedelta(days=6)))
+        # Una seconda estensione crea solo i giorni nuovi ed elimina quelli passati
+        self.assertEqual(inventory.extend(7, today=DATE + datetime.timedelta(days=1)), 10)
+        self.assertEqual(SlotInventory.objects.count(), 70)
+
+    def test_reads_skip_the_bookings_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            free = list(available_schedules(DATE, court_id=self.court.pk))
+        self.assertEqual(len(free), 9)
+        self.assertNotIn("api_booking", queries[-1]["sql"])
+        self.assertFalse(is_slot_available(self.schedule.pk, DATE))
+        # Le date fuori orizzonte usano ancora le prenotazioni
+        self.assertEqual(available_schedules(DATE + datetime.timedelta(days=30)).count(), 10)
+
+    def test_matrix_matches_bookings(self):
+        end = DATE + datetime.timedelta(days=6)
+        from_inventory = availability_matrix(DATE, end)
+        with self.settings(SLOT_INVENTORY=False):
+            self.assertEqual(availability_matrix(DATE, end), from_inventory)
+
+    def test_booking_reserves_the_slot(self):
+        url = reverse("create_booking")
+        other = self.court.schedules.get(time_slot=10)
+        response = self.client.post(url, booking_payload(other), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.slot(other).is_booked)
+
+        response = self.client.post(url, booking_payload(other), format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.filter(schedule=other).count(), 1)
+
+    def test_failed_insert_frees_the_reserved_slot(self):
+        other = self.court.schedules.get(time_slot=10)
+        # Il vincolo di unicità scatta dopo che l'inventario ha già occupato lo slot
+        with mock.patch.object(BookingSerializer, "save", side_effect=IntegrityError):
+            response = self.client.post(reverse("create_booking"), booking_payload(other), format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(self.slot(other).is_booked)
+        response = self.client.post(reverse("create_booking"), booking_payload(other), format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_moving_and_deleting_bookings_free_the_slot(self):
+        other = self.court.schedules.get(time_slot=10)
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        url = reverse("booking_detail", args=[self.booking.pk])
+
+        response = self.client.put(url, booking_payload(other), format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.slot(self.schedule).is_booked)
+        self.assertTrue(self.slot(other).is_booked)
+
+        self.client.delete(url)
+        self.assertFalse(self.slot(other).is_booked)
+
+    async def test_async_schedules_read_the_inventory(self):
+        # Cache vuota: l'orizzonte dell'inventario viene letto dal database
+        await sync_to_async(cache.clear)()
+        response = await self.async_client.get(
+            reverse("async_get_schedules"), {"court_id": self.court.pk, "date": DATE.isoformat()}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["time_slot"] for row in response.json()], list(range(10, 19)))
+
+    def test_new_schedules_cover_the_horizon(self):
+        padel = make_court("Padel", "padel", slots=[9])
+        self.assertEqual(SlotInventory.objects.filter(schedule__court=padel).count(), 7)
+        self.assertEqual(available_schedules(DATE, court_id=padel.pk).count(), 1)
+
+
+# Profilo solo API (campoclick_be/settings_api.py): URLconf, middleware e renderer ridotti
+class ApiProfileTests(BaseTestCase):
+    def test_endpoints_work_with_the_api_profile(self):
+        make_court("Centrale")
+        with self.settings(
+            ROOT_URLCONF=settings_api.ROOT_URLCONF,
+            MIDDLEWARE=settings_api.MIDDLEWARE,
+            REST_FRAMEWORK=settings_api.REST_FRAMEWORK,
+        ):
+            response = self.client.get("/api/courts/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()[0]["court_name"], "Centrale")
+            self.assertEqual(self.client.get("/admin/").status_code, 404)
+
+
+@override_settings(PERF_METRICS_TOKEN="segreto")
+class PerformanceMiddlewareTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.court = make_court("Centrale")
+
+    def metrics(self):
+        response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer segreto"})
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("get_bookings"))
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="1 query", render;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("get_courts"))
+        body = self.metrics()
+        self.assertIn('campoclick_request_duration_seconds_count{view="get_courts"} 1', body)
+        self.assertIn('campoclick_db_queries_bucket{view="get_courts",le="+Inf"} 1', body)
+        self.assertIn("campoclick_requests_in_flight 1", body)
+
+    async def test_async_views_stay_async(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(asyncio.iscoroutinefunction(PerformanceMiddleware(get_response)))
+        # Le query eseguite con sync_to_async vengono attribuite alla richiesta
+        response = await self.async_client.get(reverse("async_get_courts"))
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 query", total;dur=[\d.]+$')
+
+    @override_settings(PERF_QUERY_BUDGET=1)
+    def test_query_budget(self):
+        url = reverse("get_schedules") + f"?date={DATE.isoformat()}"
+        with self.assertLogs("api.middleware", "WARNING"):
+            response = self.client.get(url)
+        self.assertIn("oltre il budget", response["Server-Timing"])
+        body = self.metrics()
+        self.assertIn('campoclick_query_budget_exceeded_total{view="get_schedules"} 1', body)
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.metrics()
+        # Senza token configurato le metriche non sono esposte
+        with self.settings(PERF_METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+
+class DataToolingTests(BaseTestCase):
+    def test_seed_data(self):
+        call_command("seed_data", courts=2, days=3, density=1, start=DATE, stdout=io.StringIO())
+        self.assertEqual(Courts.objects.count(), 2)
+        self.assertEqual(Schedule.objects.count(), 20)
+        self.assertEqual(Booking.objects.count(), 60)
+
+    def test_bench_api_covers_every_url(self):
+        call_command("seed_data", courts=1, days=1, density=0.5, start=DATE, stdout=io.StringIO())
+        counts = (Courts.objects.count(), Booking.objects.count())
+        out = io.StringIO()
+        call_command("bench_api", requests=1, stdout=out)
+        self.assertIn("async_create_booking", out.getvalue())
+        self.assertNotRegex(out.getvalue(), r" [45]\d\d ")
+        # Le richieste del benchmark vengono annullate
+        self.assertEqual((Courts.objects.count(), Booking.objects.count()), counts)
+
+
+class BookingExportTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        court = make_court("Centrale")
+        for day in range(3):
+            make_booking(court.schedules.get(time_slot=9), DATE + datetime.timedelta(days=day))
+        self.client.force_authenticate(User.objects.create_user("staff"))
+
+    def export(self, export_format, query=""):
+        return self.client.get(reverse("export_bookings", args=[export_format]) + query)
+
+    def test_ndjson_matches_the_list_endpoint(self):
+        response = self.export("ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        listed = self.client.get(reverse("get_bookings")).json()["results"]
+        self.assertEqual([json.loads(line) for line in lines], listed)
+
+    def test_csv_with_date_filters(self):
+        day = (DATE + datetime.timedelta(days=1)).isoformat()
+        response = self.export("csv", f"?date_from={day}&date_to={day}")
+        self.assertIn('filename="prenotazioni.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["court_name"], "Centrale")
+        self.assertEqual(rows[0]["booking_date"], day)
+
+    def test_empty_csv_has_the_header(self):
+        content = b"".join(self.export("csv", "?date_from=2040-01-01").streaming_content).decode()
+        self.assertTrue(content.startswith("booking_id,"))
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_accept_header(self):
+        url = reverse("export_bookings", args=["csv"])
+        response = self.client.get(url, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 4)
+        response = self.client.get(reverse("export_bookings", args=["ndjson"]), HTTP_ACCEPT="application/x-ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        # Gli errori restano in JSON
+        response = self.client.get(url + "?date_from=ieri", HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("error", response.json())
+
+    def test_errors(self):
+        self.assertEqual(self.export("xml").status_code, 400)
+        self.assertEqual(self.export("csv", "?date_from=ieri").status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.export("csv").status_code, (401, 403))
+
+
+class OccupancyReportTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tennis = make_court("Centrale", "tennis")
+        self.padel = make_court("Padel 1", "Padel", slots=[9, 10])
+        self.end = DATE + datetime.timedelta(days=6)
+        make_booking(self.tennis.schedules.get(time_slot=9))
+        make_booking(self.tennis.schedules.get(time_slot=10))
+        make_booking(self.tennis.schedules.get(time_slot=9), DATE + datetime.timedelta(days=1))
+        make_booking(self.padel.schedules.get(time_slot=9))
+
+    def test_daily_occupancy_per_court(self):
+        report = occupancy_report(DATE, self.end)
+        self.assertEqual(
+            report[0],
+            {
+                "period": DATE.isoformat(),
+                "court_id": self.tennis.pk,
+                "bookings": 2,
+                "capacity": 10,
+                "occupancy": 0.2,
+                "revenue": "40.00",
+            },
+        )
+        self.assertEqual(
+            [(row["court_id"], row["bookings"]) for row in report[1:]],
+            [(self.padel.pk, 1), (self.tennis.pk, 1)],
+        )
+
+    def test_monthly_and_hourly_per_sport(self):
+        monthly = occupancy_report(DATE, self.end, group="month", by="sport")
+        self.assertEqual([row["period"] for row in monthly], ["2030-06-01", "2030-06-01"])
+        self.assertEqual(
+            [(row["sport"], row["bookings"], row["capacity"]) for row in monthly],
+            [("padel", 1, 14), ("tennis", 3, 70)],
+        )
+
+        hourly = occupancy_report(DATE, self.end, group="time_slot", by="sport", sport="tennis")
+        self.assertEqual(
+            [(row["period"], row["bookings"], row["capacity"]) for row in hourly], [(9, 2, 7), (10, 1, 7)]
+        )
+
+    @override_settings(OCCUPANCY_ROLLUP=True)
+    def test_rollup_matches_bookings(self):
+        # Le prenotazioni di setUp precedono l'attivazione: il riepilogo va ricostruito
+        self.assertEqual(rebuild_rollups(), 3)
+        booking = Booking.objects.get(schedule__court=self.padel)
+        booking.schedule = self.tennis.schedules.get(time_slot=11)
+        booking.save()
+        make_booking(self.padel.schedules.get(time_slot=10), DATE + datetime.timedelta(days=2))
+
+        # Il report non ricalcola il riepilogo: i giorni stale vengono letti dalle prenotazioni
+        stale = OccupancyRollup.objects.filter(stale=True).count()
+        for refresh in (False, True):
+            if refresh:
+                self.assertEqual(refresh_rollups(), stale)
+            for group in ("day", "week", "month"):
+                from_rollup = occupancy_report(DATE, self.end, group=group)
+                with self.settings(OCCUPANCY_ROLLUP=False):
+                    self.assertEqual(from_rollup, occupancy_report(DATE, self.end, group=group))
+            self.assertEqual(OccupancyRollup.objects.filter(stale=True).exists(), not refresh)
+        # Il campo padel non ha più prenotazioni il primo giorno: la riga viene eliminata
+        self.assertFalse(OccupancyRollup.objects.filter(court=self.padel, date=DATE).exists())
+
+    def test_endpoint(self):
+        url = reverse("get_occupancy_report")
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+        self.client.force_authenticate(User.objects.create_user("manager"))
+        response = self.client.get(url, {"start": DATE, "end": self.end, "group": "week", "by": "sport"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][1]["revenue"], "60.00")
+        for params in (
+            {"start": DATE},
+            {"start": DATE, "end": self.end, "group": "year"},
+            {"start": DATE, "end": self.end, "by": "city"},
+        ):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class SparseFieldsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis", slots=[9, 10])
+        for day in range(3):
+            make_booking(self.court.schedules.get(time_slot=9), DATE + datetime.timedelta(days=day))
+
+    def test_fields_on_lists_and_details(self):
+        response = self.client.get(reverse("get_courts"), {"fields": "court_id,court_name"})
+        self.assertEqual(response.json(), [{"court_id": self.court.pk, "court_name": "Centrale"}])
+
+        url = reverse("court_detail", args=[self.court.pk])
+        self.assertEqual(self.client.get(url, {"fields": "court_name"}).json(), {"court_name": "Centrale"})
+        self.assertEqual(self.client.get(url, {"fields": "stadio"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("court_detail", args=[0])).status_code, 404)
+
+    def test_booking_fields_narrow_the_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("get_bookings"), {"fields": "booking_id,email", "page_size": 2}
+            )
+        self.assertEqual(set(response.data["results"][0]), {"booking_id", "email"})
+        self.assertNotIn("court_name", queries[0]["sql"])
+        # Le colonne del cursore vengono lette comunque: la pagina successiva funziona
+        response = self.client.get(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_expand_court_on_schedules(self):
+        url = reverse("get_schedules")
+        rows = self.client.get(url, {"expand": "court", "fields": "time_slot,court_name"}).json()
+        self.assertEqual(
+            rows, [{"time_slot": 9, "court_name": "Centrale"}, {"time_slot": 10, "court_name": "Centrale"}]
+        )
+        self.assertNotIn("court_name", self.client.get(url).json()[0])
+        self.assertEqual(self.client.get(url, {"expand": "prezzi"}).status_code, 400)
+
+    def test_columnar_format(self):
+        response = self.client.get(reverse("get_courts"), {"format": "columnar", "fields": "court_id,court_name"})
+        self.assertEqual(response["Content-Type"], "application/vnd.campoclick.columnar+json")
+        self.assertEqual(
+            response.json(), {"columns": ["court_id", "court_name"], "rows": [[self.court.pk, "Centrale"]]}
+        )
+
+        response = self.client.get(
+            reverse("get_bookings"),
+            {"fields": "booking_date"},
+            HTTP_ACCEPT="application/vnd.campoclick.columnar+json",
+        )
+        results = response.json()["results"]
+        self.assertEqual(results["columns"], ["booking_date"])
+        self.assertEqual(len(results["rows"]), 3)
+
+    async def test_async_views_support_fields_and_columnar(self):
+        params = {"fields": "court_id,court_name", "format": "columnar"}
+        sync = await sync_to_async(self.client.get)(reverse("get_courts"), params)
+        response = await self.async_client.get(reverse("async_get_courts"), params)
+        self.assertEqual(response.content, sync.content)
+
+
+# Orologio controllato dai test per i limiti basati sul tempo
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class BookingThrottleTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.court = make_court()
+        self.url = reverse("create_booking")
+        self.clock = FakeClock()
+        patcher = mock.patch.object(BookingRateThrottle, "timer", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def book(self, hour, email="mario@example.com", url=None):
+        payload = booking_payload(self.court.schedules.get(time_slot=hour), email=email)
+        return self.client.post(url or self.url, payload, format="json")
+
+    @override_settings(BOOKING_RATE_LIMITS={"email": "2/min"})
+    def test_email_bucket_refills_over_time(self):
+        self.assertEqual(self.book(9).status_code, 201)
+        self.assertEqual(self.book(10, email="MARIO@example.com").status_code, 201)
+        response = self.book(11)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        # Un'altra email non è limitata
+        self.assertEqual(self.book(12, email="luigi@example.com").status_code, 201)
+
+        self.clock.advance(30)
+        self.assertEqual(self.book(11).status_code, 201)
+        self.assertEqual(self.book(13).status_code, 429)
+
+    @override_settings(BOOKING_RATE_LIMITS={"ip": "3/h"})
+    def test_ip_bucket(self):
+        for hour in (9, 10, 11):
+            self.assertEqual(self.book(hour, email=f"utente{hour}@example.com").status_code, 201)
+        self.assertEqual(self.book(12, email="altro@example.com").status_code, 429)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    @override_settings(BOOKING_RATE_LIMITS={"ip": "2/h"})
+    def test_forwarded_for_header_cannot_bypass_the_ip_bucket(self):
+        for hour, url in ((9, self.url), (10, reverse("async_create_booking")), (11, self.url)):
+            payload = booking_payload(self.court.schedules.get(time_slot=hour), email=f"utente{hour}@example.com")
+            # Ogni richiesta dichiara un IP diverso
+            response = self.client.post(
+                url, json.dumps(payload), content_type="application/json", HTTP_X_FORWARDED_FOR=f"10.0.0.{hour}"
+            )
+        self.assertEqual(response.status_code, 429)
+
+        # Dietro un proxy fidato conta l'indirizzo aggiunto dal proxy, non quelli inviati dal client
+        cache.clear()
+        with self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            for hour in (12, 13, 14):
+                response = self.client.post(
+                    self.url,
+                    booking_payload(self.court.schedules.get(time_slot=hour), email=f"utente{hour}@example.com"),
+                    format="json",
+                    HTTP_X_FORWARDED_FOR=f"10.0.0.{hour}, 203.0.113.7",
+                )
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(BOOKING_RATE_LIMITS={"email": "1/min"})
+    def test_async_view_is_limited(self):
+        url = reverse("async_create_booking")
+        payload = json.dumps(booking_payload(self.court.schedules.get(time_slot=9)))
+        self.assertEqual(self.client.post(url, payload, content_type="application/json").status_code, 201)
+        response = self.client.post(url, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+
+    @override_settings(LOAD_SHED_MAX_IN_FLIGHT=1)
+    def test_sheds_load_when_too_many_requests_are_in_flight(self):
+        registry.add_in_flight(1)  # un'altra richiesta in corso
+        self.addCleanup(registry.add_in_flight, -1)
+        payload = booking_payload(self.court.schedules.get(time_slot=9))
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, payload, format="json")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+
+    @override_settings(LOAD_SHED_DB_LATENCY=0.1, LOAD_SHED_RETRY_AFTER=5)
+    def test_sheds_load_while_the_database_is_slow(self):
+        clock = FakeClock(time.monotonic())
+        registry.observe_query(0.5)
+        with mock.patch.object(LoadSheddingThrottle, "timer", clock):
+            self.assertEqual(self.book(9).status_code, 503)
+            # Senza nuove misure la latenza scade e le richieste ripartono
+            clock.advance(11)
+            self.assertEqual(self.book(9).status_code, 201)
+
+
+class CascadeDeleteTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis")
+        self.other = make_court("Padel", "padel", slots=[9])
+        self.past = datetime.date(2020, 1, 1)
+        make_booking(self.court.schedules.get(time_slot=9), self.past)
+        make_booking(self.court.schedules.get(time_slot=10))
+        make_booking(self.other.schedules.get(time_slot=9))
+        self.client.force_authenticate(User.objects.create_user("staff"))
+
+    @override_settings(ARCHIVE_DELETED_BOOKINGS=True)
+    def test_delete_court_archives_past_bookings(self):
+        response = self.client.delete(reverse("court_detail", args=[self.court.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Schedule.objects.filter(court_id=self.court.pk).exists())
+        self.assertEqual(list(Booking.objects.values_list("schedule__court", flat=True)), [self.other.pk])
+
+        archived = BookingArchive.objects.get()
+        self.assertEqual(
+            (archived.court_id, archived.court_name, archived.time_slot, archived.price, archived.booking_date),
+            (self.court.pk, "Centrale", 9, Decimal("20.00"), self.past),
+        )
+
+    def test_query_count_does_not_grow_with_bookings(self):
+        for offset in range(1, 30):
+            make_booking(self.court.schedules.get(time_slot=11), DATE + datetime.timedelta(days=offset))
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(services.delete_court(self.court), (31, 0))
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(services.delete_court(self.other), (1, 0))
+        self.assertEqual(len(many), len(one))
+        self.assertFalse(BookingArchive.objects.exists())
+
+    def test_delete_schedule_refreshes_availability(self):
+        url = reverse("get_schedules")
+        response = self.client.get(url, {"date": DATE.isoformat(), "court_id": self.court.pk})
+        self.assertEqual(len(response.json()), 9)
+
+        schedule = self.court.schedules.get(time_slot=10)
+        self.client.delete(reverse("schedule_detail", args=[schedule.pk]))
+        self.assertFalse(Booking.objects.filter(booking_date=DATE, schedule__court=self.court).exists())
+        response = self.client.get(url, {"date": DATE.isoformat(), "court_id": self.court.pk})
+        self.assertEqual(len(response.json()), 9)
+        self.assertNotIn(10, [row["time_slot"] for row in response.json()])
+
+    @override_settings(OCCUPANCY_ROLLUP=True)
+    def test_delete_court_drops_its_rollups(self):
+        rebuild_rollups()
+        services.delete_court(self.court)
+        refresh_rollups()
+        self.assertEqual(list(OccupancyRollup.objects.values_list("court_id", flat=True)), [self.other.pk])
+
+    @override_settings(OCCUPANCY_ROLLUP=True)
+    def test_rollup_reports_keep_archived_deleted_courts(self):
+        rebuild_rollups()
+        services.delete_court(self.court, archive=True)
+        refresh_rollups()
+        for params in ({"by": "sport"}, {"sport": "tennis"}, {"by": "sport", "group": "month"}):
+            from_rollup = occupancy_report(self.past, DATE, **params)
+            with self.settings(OCCUPANCY_ROLLUP=False):
+                self.assertEqual(from_rollup, occupancy_report(self.past, DATE, **params))
+        self.assertEqual(occupancy_report(self.past, self.past, sport="tennis")[0]["bookings"], 1)
+
+
+class BookingArchiveTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis")
+        self.schedule = self.court.schedules.get(time_slot=9)
+        self.old_date = datetime.date.today() - datetime.timedelta(days=400)
+        self.old = make_booking(self.schedule, self.old_date)
+        self.recent = make_booking(self.schedule)
+        self.client.force_authenticate(User.objects.create_user("staff"))
+
+    def archive(self):
+        call_command("archive_bookings", stdout=io.StringIO())
+
+    def test_old_bookings_move_to_the_archive(self):
+        url = reverse("booking_detail", args=[self.old.pk])
+        before = self.client.get(url).json()
+        self.archive()
+        self.assertEqual(list(Booking.objects.values_list("pk", flat=True)), [self.recent.pk])
+        self.assertEqual(BookingArchive.objects.get().pk, self.old.pk)
+
+        # Il dettaglio legge l'archivio con la stessa forma; le righe archiviate non si modificano
+        self.assertEqual(self.client.get(url).json(), before)
+        response = self.client.get(url, {"fields": "court_name,booking_time"})
+        self.assertEqual(response.json(), {"court_name": "Centrale", "booking_time": "9"})
+        self.assertEqual(self.client.put(url, booking_payload(self.schedule), format="json").status_code, 404)
+
+    def test_reports_include_archived_bookings(self):
+        start, end = self.old_date, DATE
+        before = occupancy_report(start, end, group="month", by="sport")
+        self.archive()
+        self.assertEqual(occupancy_report(start, end, group="month", by="sport"), before)
+        self.assertEqual(occupancy_report(start, end, group="time_slot")[0]["bookings"], 2)
+
+        with self.settings(OCCUPANCY_ROLLUP=True):
+            rebuild_rollups()
+            self.assertEqual(occupancy_report(start, end, group="month", by="sport"), before)
+
+    def test_dates_before_the_retention_window_are_rejected(self):
+        payload = booking_payload(self.court.schedules.get(time_slot=10), self.old_date)
+        response = self.client.post(reverse("create_booking"), payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("booking_date", response.json())
+
+        with self.assertRaises(CommandError):
+            call_command("archive_bookings", days=30, stdout=io.StringIO())
+
+
+@override_settings(LIVE_UPDATES=True)
+class LiveUpdatesTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis", slots=[9, 10])
+        self.other = make_court("Padel", "padel", slots=[9])
+        self.booking = make_booking(self.court.schedules.get(time_slot=9))
+        self.url = reverse("live_availability")
+
+    # Le scritture avvengono in un thread come nelle view sincrone; gli eventi partono al commit
+    def write(self, func, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args)
+
+    async def next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        event, data = chunk.decode().strip().split("\n")
+        return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+    async def test_stream_sends_snapshot_and_slot_changes(self):
+        response = await self.async_client.get(self.url, {"court_id": self.court.pk, "date": DATE.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(
+            await self.next_event(stream),
+            ("snapshot", {"court_id": self.court.pk, "date": DATE.isoformat(), "available": [10]}),
+        )
+
+        slot_10 = await self.court.schedules.aget(time_slot=10)
+        other = await self.other.schedules.aget()
+        # Le prenotazioni di altri campi non arrivano a questo stream
+        await sync_to_async(self.write)(make_booking, other)
+        await sync_to_async(self.write)(make_booking, slot_10)
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data["time_slot"], data["date"]), ("slot_taken", 10, DATE.isoformat()))
+
+        await sync_to_async(self.write)(self.booking.delete)
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data["time_slot"]), ("slot_freed", 9))
+
+        channel = pubsub.slot_channel(self.court.pk, DATE)
+        self.assertEqual(pubsub.get_broker().subscribers(channel), 1)
+        # Django chiude la risposta alla disconnessione del client
+        await stream.aclose()
+        await sync_to_async(response.close)()
+        self.assertEqual(pubsub.get_broker().subscribers(channel), 0)
+
+    async def test_slow_clients_are_asked_to_resync(self):
+        subscription = pubsub.get_broker().subscribe("test", maxsize=2)
+        stream = pubsub.EventStream(subscription, heartbeat=0.01).__aiter__()
+        for index in range(3):
+            pubsub.get_broker().publish("test", {"event": "slot_taken", "time_slot": index})
+        await asyncio.sleep(0)
+        self.assertEqual(await self.next_event(stream), ("resync", {}))
+        self.assertEqual(await anext(stream), b": ping\n\n")
+        await stream.aclose()
+        self.assertEqual(pubsub.get_broker().subscribers("test"), 0)
+
+    def test_publish_errors_do_not_fail_committed_writes(self):
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        slot_10 = self.court.schedules.get(time_slot=10)
+        with mock.patch.object(pubsub.LocalBroker, "publish", side_effect=RuntimeError("NOTIFY")):
+            with self.assertLogs("api.pubsub", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse("create_booking"), booking_payload(slot_10), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Booking.objects.filter(schedule=slot_10).exists())
+
+    def test_invalid_requests(self):
+        # Il client di test sincrono crea richieste WSGI
+        response = self.client.get(self.url, {"court_id": self.court.pk, "date": DATE.isoformat()})
+        self.assertEqual(response.status_code, 501)
+        with self.settings(LIVE_UPDATES=False):
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    async def test_missing_parameters(self):
+        response = await self.async_client.get(self.url, {"date": DATE.isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+
+class PricingTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.court = make_court("Centrale", "tennis", slots=[9, 18])
+        self.other = make_court("Padel", "padel", slots=[9])
+        self.morning = self.court.schedules.get(time_slot=9)
+        self.evening = self.court.schedules.get(time_slot=18)
+        # Fine settimana +50%, sera +5 euro (in quest'ordine)
+        PricingRule.objects.create(name="Weekend", weekdays="56", percent=50)
+        PricingRule.objects.create(name="Sera", sport="Tennis", first_slot=17, amount=Decimal("5.00"), priority=1)
+
+    def prices(self, date=DATE):
+        response = self.client.get(reverse("get_schedules"), {"date": date.isoformat()})
+        return {(row["court"], row["time_slot"]): row["effective_price"] for row in response.data}
+
+    def test_rules_are_applied_in_priority_order(self):
+        self.assertEqual(
+            self.prices(),
+            {(self.court.pk, 9): "20.00", (self.court.pk, 18): "25.00", (self.other.pk, 9): "20.00"},
+        )
+        saturday = DATE + datetime.timedelta(days=5)
+        self.assertEqual(
+            self.prices(saturday),
+            {(self.court.pk, 9): "30.00", (self.court.pk, 18): "35.00", (self.other.pk, 9): "30.00"},
+        )
+        # Senza data non c'è un prezzo effettivo
+        response = self.client.get(reverse("get_schedules"))
+        self.assertNotIn("effective_price", response.data[0])
+
+    def test_price_tables_are_cached_and_invalidated_by_rules(self):
+        self.prices()
+        with self.assertNumQueries(0):
+            self.assertEqual(pricing.effective_price(self.evening, DATE), Decimal("25.00"))
+
+        PricingRule.objects.filter(name="Sera").update(active=False)
+        # update() non invia segnali: la tabella in cache resta valida fino a invalidate_rules()
+        self.assertEqual(self.prices()[self.court.pk, 18], "25.00")
+        pricing.invalidate_rules()
+        self.assertEqual(self.prices()[self.court.pk, 18], "20.00")
+
+        # Il salvataggio di una regola invalida le tabelle
+        PricingRule.objects.create(name="Promo", court=self.other, percent=-25)
+        self.assertEqual(self.prices()[self.other.pk, 9], "15.00")
+
+    def test_occupancy_surcharge_follows_bookings(self):
+        PricingRule.objects.create(name="Quasi pieno", min_occupancy=Decimal("0.5"), amount=Decimal("2.00"))
+        self.assertEqual(self.prices()[self.court.pk, 18], "25.00")
+        make_booking(self.morning)
+        self.assertEqual(self.prices()[self.court.pk, 18], "27.00")
+        # L'occupazione di un campo non cambia i prezzi degli altri
+        self.assertEqual(self.prices()[self.other.pk, 9], "20.00")
+
+    def test_booking_keeps_the_price_charged(self):
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        response = self.client.post(reverse("create_booking"), booking_payload(self.evening), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["price_charged"], "25.00")
+        booking = Booking.objects.get()
+
+        # Le regole successive non cambiano il prezzo già fissato, nemmeno modificando la prenotazione
+        PricingRule.objects.create(name="Aumento", amount=Decimal("10.00"))
+        url = reverse("booking_detail", args=[booking.pk])
+        response = self.client.put(url, booking_payload(self.evening, email="nuova@example.com"), format="json")
+        self.assertEqual(response.data["price_charged"], "25.00")
+        # Cambiando slot il prezzo viene ricalcolato
+        response = self.client.put(url, booking_payload(self.morning), format="json")
+        self.assertEqual(response.data["price_charged"], "30.00")
+
+        # Il prezzo non è modificabile dal client
+        payload = {**booking_payload(self.morning), "price_charged": "1.00"}
+        response = self.client.put(url, payload, format="json")
+        self.assertEqual(response.data["price_charged"], "30.00")
+
+    @override_settings(SHARED_CACHE=False)
+    def test_bulk_query_count_does_not_depend_on_dates(self):
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        url = reverse("create_bookings_bulk")
+        counts = []
+        for days in (1, 10):
+            dates = [DATE + datetime.timedelta(days=day) for day in range(days)]
+            payload = [booking_payload(self.evening, date) for date in dates]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, payload, format="json")
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+            # Le regole vengono lette una sola volta
+            rule_reads = [q for q in queries if q["sql"].startswith('SELECT "api_pricingrule"')]
+            self.assertEqual(len(rule_reads), 1)
+            Booking.objects.all().delete()
+        self.assertEqual(counts[0], counts[1])
+
+        # Senza regole per il campo il prezzo è quello base, senza leggere le regole
+        PricingRule.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("create_booking"), booking_payload(self.evening), format="json")
+        self.assertEqual(response.data["price_charged"], "20.00")
+        self.assertFalse(any(q["sql"].startswith('SELECT "api_pricingrule"') for q in queries))
+
+    def test_bulk_bookings_and_reports_use_the_price_charged(self):
+        self.client.force_authenticate(User.objects.create_user("staff"))
+        saturday = DATE + datetime.timedelta(days=5)
+        payload = [booking_payload(self.evening), booking_payload(self.evening, date=saturday)]
+        response = self.client.post(reverse("create_bookings_bulk"), payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row["price_charged"] for row in response.data], ["25.00", "35.00"])
+
+        # Le prenotazioni precedenti ai prezzi dinamici usano il prezzo dell'orario
+        make_booking(self.morning)
+        report = occupancy_report(DATE, saturday)
+        self.assertEqual(
+            [(row["period"], row["revenue"]) for row in report if row["court_id"] == self.court.pk],
+            [(DATE.isoformat(), "45.00"), (saturday.isoformat(), "35.00")],
+        )
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN verificato solo su PostgreSQL")
+class QueryPlanTests(BaseTestCase):
+    # Esegue EXPLAIN su ogni SELECT delle view con le scansioni sequenziali
+    # disabilitate: se il piano contiene ancora "Seq Scan" nessun indice copre la query
+
+    @classmethod
+    def setUpTestData(cls):
+        courts = Courts.objects.bulk_create(
+            [
+                Courts(court_name=f"Campo {i}", court_type=("tennis", "padel", "calcio")[i % 3], court_surface="terra")
+                for i in range(60)
+            ]
+        )
+        schedules = Schedule.objects.bulk_create(
+            [Schedule(court=court, time_slot=hour, price=Decimal("20.00")) for court in courts for hour in range(9, 19)]
+        )
+        Booking.objects.bulk_create(
+            [
+                Booking(
+                    schedule=schedule,
+                    booking_date=DATE + datetime.timedelta(days=day),
+                    name="Mario",
+                    surname="Rossi",
+                    email=f"utente{schedule.pk % 50}@example.com",
+                    phone="3331234567",
+                )
+                for day in range(30)
+                for schedule in schedules[day % 2 :: 2]
+            ]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.court = courts[0]
+        cls.schedule = schedules[0]
+        cls.booking = Booking.objects.first()
+
+    def assertNoSeqScan(self, url, params=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertTrue(selects, url)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for sql in selects:
+                cursor.execute("EXPLAIN " + sql)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                self.assertNotIn("Seq Scan", plan, f"{url} {params}\n{sql}\n{plan}")
+            cursor.execute("SET LOCAL enable_seqscan = on")
+
+    def test_court_queries(self):
+        self.assertNoSeqScan(reverse("get_courts"), {"sport": "Tennis"})
+        self.assertNoSeqScan(reverse("court_detail", args=[self.court.pk]))
+
+    def test_schedule_queries(self):
+        date = DATE.isoformat()
+        self.assertNoSeqScan(reverse("get_schedules"), {"court_id": self.court.pk, "date": date})
+        self.assertNoSeqScan(reverse("get_schedules"), {"sport": "padel", "date": date})
+        self.assertNoSeqScan(reverse("schedule_detail", args=[self.schedule.pk]))
+        end = (DATE + datetime.timedelta(days=13)).isoformat()
+        self.assertNoSeqScan(reverse("get_availability"), {"start": date, "end": end, "sport": "calcio"})
+
+    def test_booking_queries(self):
+        url = reverse("get_bookings")
+        self.assertNoSeqScan(url, {"email": "utente7@example.com"})
+        self.assertNoSeqScan(url, {"date_from": DATE.isoformat(), "date_to": DATE.isoformat()})
+        self.assertNoSeqScan(url, {"court_id": self.court.pk})
+        self.assertNoSeqScan(reverse("booking_detail", args=[self.booking.pk]))
+
+
+@unittest.skipUnless(connection.features.has_select_for_update, "Richiede lock di riga (PostgreSQL)")
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        cache.clear()
+        self.schedule = make_court().schedules.get(time_slot=9)
+
+    # Invia THREADS richieste contemporanee sullo stesso slot
+    def fire(self, payload_for, headers_for):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def worker(index):
+            try:
+                barrier.wait()
+                response = APIClient().post(
+                    reverse("create_booking"),
+                    payload_for(index),
+                    format="json",
+                    headers=headers_for(index),
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_only_one_concurrent_booking_succeeds(self):
+        statuses = self.fire(
+            lambda index: booking_payload(self.schedule, email=f"utente{index}@example.com"),
+            lambda index: {},
+        )
+        self.assertEqual(sorted(statuses), [201] + [409] * (self.THREADS - 1))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_concurrent_retries_with_same_key_insert_once(self):
+        statuses = self.fire(
+            lambda index: booking_payload(self.schedule),
+            lambda index: {"Idempotency-Key": "burst"},
+        )
+        self.assertEqual(statuses, [201] * self.THREADS)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
@@ -0,0 +1,104 @@
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+# Protezione dell'endpoint pubblico di prenotazione:
+# - BookingRateThrottle: token bucket per IP e per email, con lo stato nella
+#   cache di Django (condivisa tra i processi se il backend lo è). Lettura e
+#   scrittura non sono atomiche: con richieste concorrenti sulla stessa chiave
+#   il limite è approssimato, ma non viene mai superato di molto.
+# - LoadSheddingThrottle: risponde 503 con Retry-After quando le richieste in
+#   corso o la latenza media del database (misurate da PerformanceMiddleware)
+#   superano le soglie configurate, prima di eseguire qualsiasi query.
+# Entrambe le classi hanno l'attributo timer sostituibile nei test.
+
+OVERLOADED_MESSAGE = "Servizio temporaneamente sovraccarico, riprovare più tardi."
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = OVERLOADED_MESSAGE
+    default_code = "overloaded"
+
+    def __init__(self, wait):
+        super().__init__()
+        # Letto dall'exception handler di DRF per l'header Retry-After
+        self.wait = wait
+
+
+# "10/min" -> (10, 60): capacità del bucket e secondi per ricaricarlo del tutto
+def parse_rate(rate):
+    if not rate:
+        return None
+    tokens, period = rate.split("/")
+    return int(tokens), PERIODS[period[0]]
+
+
+# Consuma un token dal bucket indicato: restituisce 0 se la richiesta è
+# ammessa, altrimenti i secondi da attendere per il prossimo token
+def take_token(key, rate, now):
+    capacity, period = rate
+    refill = capacity / period
+    tokens, updated = cache.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * refill)
+    if tokens < 1:
+        return (1 - tokens) / refill
+    cache.set(key, (tokens - 1, now), timeout=period)
+    return 0
+
+
+class BookingRateThrottle(BaseThrottle):
+    timer = time.time
+
+    def allow_request(self, request, view):
+        data = request.data
+        self.wait_time = self.check(self.get_ident(request), data.get("email") if hasattr(data, "get") else None)
+        return self.wait_time == 0
+
+    # Secondi da attendere (0 = richiesta ammessa) per l'IP e l'email indicati;
+    # usato direttamente dalle view asincrone, che non passano da DRF
+    def check(self, ident, email):
+        rates = getattr(settings, "BOOKING_RATE_LIMITS", {})
+        keys = {"ip": ident}
+        if isinstance(email, str) and email.strip():
+            keys["email"] = email.strip().lower()
+
+        now = self.timer()
+        wait = 0
+        for name, value in keys.items():
+            rate = parse_rate(rates.get(name))
+            if rate is not None:
+                key = f"campoclick:throttle:booking:{name}:{quote(value)}"
+                wait = max(wait, take_token(key, rate, now))
+        return wait
+
+    def wait(self):
+        return self.wait_time
+
+
+class LoadSheddingThrottle(BaseThrottle):
+    timer = time.monotonic
+
+    def allow_request(self, request, view):
+        max_in_flight = getattr(settings, "LOAD_SHED_MAX_IN_FLIGHT", 0)
+        max_latency = getattr(settings, "LOAD_SHED_DB_LATENCY", 0)
+        retry_after = getattr(settings, "LOAD_SHED_RETRY_AFTER", 5)
+
+        # La richiesta corrente è già conteggiata tra quelle in corso
+        if max_in_flight and registry.in_flight > max_in_flight:
+            raise Overloaded(retry_after)
+        # La latenza conta solo se misurata di recente: senza query (es: tutte le
+        # richieste respinte) il carico non può restare segnalato per sempre
+        latency = registry.recent_db_latency(self.timer(), max_age=retry_after * 2)
+        if max_latency and latency is not None and latency > max_latency:
+            raise Overloaded(retry_after)
+        return True
@@ -1,14 +1,21 @@
 from django.urls import path
+from . import async_views
 from .views import (
     get_courts,
     create_court,
     court_detail,
     get_schedules,
+    get_availability,
     create_schedule,
+    create_schedules_bulk,
     schedule_detail,
     get_bookings,
     create_booking,
+    create_bookings_bulk,
+    export_bookings,
     booking_detail,
+    get_occupancy_report,
+    metrics,
 )
 
 urlpatterns = [
@@ -19,9 +26,23 @@ urlpatterns = [
     # URL per gli orari
     path("schedules/", get_schedules, name="get_schedules"),
     path("schedules/create/", create_schedule, name="create_schedule"),
+    path("schedules/bulk/", create_schedules_bulk, name="create_schedules_bulk"),
+    path("schedules/availability/", get_availability, name="get_availability"),
     path("schedules/<str:pk>/", schedule_detail, name="schedule_detail"),
     # URL per le prenotazioni
     path("bookings/", get_bookings, name="get_bookings"),
     path("bookings/create/", create_booking, name="create_booking"),
+    path("bookings/bulk/", create_bookings_bulk, name="create_bookings_bulk"),
+    path("bookings/export/<str:export_format>/", export_bookings, name="export_bookings"),
     path("bookings/<str:pk>/", booking_detail, name="booking_detail"),
+    # Versioni asincrone (ASGI) degli endpoint pubblici
+    path("async/courts/", async_views.get_courts, name="async_get_courts"),
+    path("async/schedules/", async_views.get_schedules, name="async_get_schedules"),
+    path("async/schedules/live/", async_views.live_availability, name="live_availability"),
+    path("async/bookings/", async_views.get_bookings, name="async_get_bookings"),
+    path("async/bookings/create/", async_views.create_booking, name="async_create_booking"),
+    # Report di occupazione e incassi
+    path("reports/occupancy/", get_occupancy_report, name="get_occupancy_report"),
+    # Metriche Prometheus (PerformanceMiddleware)
+    path("metrics/", metrics, name="metrics"),
 ]
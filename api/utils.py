@@ -0,0 +1,22 @@
+from django.utils.dateparse import parse_date
+
+
+# Converte un parametro di query in data (YYYY-MM-DD), restituisce None se non valido
+def parse_query_date(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+# Converte un parametro di query in intero, restituisce None se non valido
+def parse_query_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Converte un parametro di query separato da virgole in lista (es: "a,b" -> ["a", "b"])
+def parse_query_list(value):
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
@@ -1,32 +1,84 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.core.exceptions import ValidationError
-from .models import Courts, Schedule, Booking
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from .models import Courts, Schedule, Booking, BookingArchive
+from .availability import (
+    MAX_MATRIX_DAYS,
+    SLOTS,
+    available_schedules,
+    availability_matrix,
+)
+from . import pricing, services
+from .conditional import table_condition
+from .pagination import BookingKeysetPagination
+from .cache import get_or_compute, get_or_compute_per_court
+from .export import FORMATS, stream_bookings
+from .renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from .throttling import BookingRateThrottle, LoadSheddingThrottle
+from .reports import DIMENSIONS, GROUPS, MAX_REPORT_DAYS, occupancy_report
+from .metrics import registry
+from .queries import (
+    INVALID_DATE_MESSAGE,
+    filter_bookings,
+    filter_courts,
+    parse_court_id,
+    select_fields,
+)
+from .utils import parse_query_date, parse_query_list
+from .fastpath import ValuesSerializer
 from .serializer import (
     CourtsSerializer,
     ScheduleSerializer,
+    ScheduleCourtSerializer,
     BookingSerializer,
+    BookingArchiveSerializer,
 )
 
+# Serializzazione di sola lettura per le liste (stesso output dei serializer, senza istanziare i modelli)
+courts_values = ValuesSerializer(CourtsSerializer)
+schedules_values = ValuesSerializer(ScheduleSerializer, expand={"court": ScheduleCourtSerializer})
+bookings_values = ValuesSerializer(BookingSerializer)
+archive_values = ValuesSerializer(BookingArchiveSerializer)
+
 
 # ********** CAMPI SPORTIVI **********
 
 
+# Id dei campi (filtrati per sport ed eventualmente per court_id), letti dalla cache
+def _court_ids(sport=None, court_id=None):
+    court_ids = get_or_compute(
+        "court_ids",
+        "courts",
+        [sport.lower() if sport else ""],
+        lambda: list(filter_courts(sport).order_by("court_id").values_list("court_id", flat=True)),
+    )
+    if court_id is not None:
+        court_ids = [pk for pk in court_ids if pk == court_id]
+    return court_ids
+
+
 # Recupera tutti i campi sportivi
+@table_condition(["courts"])
 @api_view(["GET"])
 def get_courts(request):
-    # Se viene passato un parametro sport (es: "/courts?sport=tennis"), filtra i campi sportivi per court_type
     sport = request.query_params.get("sport", None)
-    if sport:
-        courts = Courts.objects.filter(
-            court_type__iexact=sport
-        )  # __iexact per non distinguere tra maiuscole e minuscole
-    else:
-        courts = Courts.objects.all()
-    serializer = CourtsSerializer(courts, many=True)
-    return Response(serializer.data)
+    selected, error = select_fields(courts_values, request.query_params)
+    if error:
+        return _bad_request(error)
+
+    data = get_or_compute(
+        "courts",
+        "courts",
+        [sport.lower() if sport else ""],
+        lambda: courts_values.rows(filter_courts(sport)),
+    )
+    return Response(_project(selected, data, request))
 
 
 @api_view(["POST"])
@@ -39,53 +91,147 @@ def create_court(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@table_condition(["courts"])
 @api_view(["GET", "PUT", "DELETE"])
 def court_detail(request, pk):
     # Gestisce le operazioni di dettaglio per un singolo campo sportivo
+    # Recupera i dettagli di un campo sportivo (solo le colonne richieste con ?fields=)
+    if request.method == "GET":
+        return _detail(courts_values, Courts.objects.filter(pk=pk), request)
+
     try:
         court = Courts.objects.get(pk=pk)
     except Courts.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    # Recupera i dettagli di un campo sportivo
-    if request.method == "GET":
-        serializer = CourtsSerializer(court)
-        return Response(serializer.data)
-
     # Aggiorna i dettagli di un campo sportivo
-    elif request.method == "PUT":
+    if request.method == "PUT":
         serializer = CourtsSerializer(court, data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    # Cancella un campo sportivo
+    # Cancella un campo sportivo (le prenotazioni a blocchi, vedi services.delete_court)
     elif request.method == "DELETE":
-        court.delete()
+        services.delete_court(court, archive=settings.ARCHIVE_DELETED_BOOKINGS)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 # ********** ORARI **********
 
 
+def _bad_request(message):
+    return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# Riduce righe complete (es: lette dalla cache) ai campi richiesti con ?fields=
+def _project(selected, rows, request):
+    if not request.query_params.get("fields"):
+        return rows
+    return [selected.project(row) for row in rows]
+
+
+# Dettaglio in sola lettura: con ?fields= / ?expand= la SELECT legge solo le colonne richieste
+def _detail(values_serializer, queryset, request):
+    selected, error = select_fields(values_serializer, request.query_params)
+    if error:
+        return _bad_request(error)
+    row = selected.values(queryset).first()
+    if row is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return Response(selected.to_representation(row))
+
+
+# Le schedules dipendono anche dalle prenotazioni e dalle regole di prezzo
+# solo se viene richiesta una data
+def _schedules_tables(request):
+    tables = ["courts", "schedules"]
+    if request.GET.get("date"):
+        tables += ["bookings", "pricing"]
+    return tables
+
+
+@table_condition(_schedules_tables)
 @api_view(["GET"])
 def get_schedules(request):
-    court_id = request.query_params.get("court_id", None)
+    sport = request.query_params.get("sport", None)
     date = request.query_params.get("date", None)
+    court_id, error = parse_court_id(request.query_params)
+    if error:
+        return _bad_request(error)
 
-    schedules = Schedule.objects.all()
-
-    # Filtra le schedules per court_id se specificato
-    if court_id:
-        schedules = schedules.filter(court_id=court_id)
-
+    booking_date = None
     if date:
-        # Filtra le schedules disponibili per la data specificata
-        schedules = [schedule for schedule in schedules if schedule.is_available(date)]
+        booking_date = parse_query_date(date)
+        if booking_date is None:
+            return _bad_request(INVALID_DATE_MESSAGE)
+
+    selected, error = select_fields(schedules_values, request.query_params)
+    if error:
+        return _bad_request(error)
+    # In cache ci sono le righe complete (con le espansioni richieste)
+    expand = parse_query_list(request.query_params.get("expand"))
+    full = schedules_values.select(expand=expand)
+
+    def compute(missing):
+        if booking_date:
+            # Filtra le schedules disponibili per la data specificata con una sola query
+            schedules = available_schedules(booking_date)
+        else:
+            schedules = Schedule.objects.all()
+        schedules = schedules.filter(court_id__in=missing).order_by("court_id", "time_slot")
+
+        # Con una data ogni orario riporta il prezzo effettivo (tabella dei prezzi del campo)
+        prices = pricing.price_tables(booking_date, missing) if booking_date else {}
+        grouped = {}
+        for item in full.rows(schedules):
+            if booking_date:
+                item["effective_price"] = prices[item["court"]].get(item["schedule_id"], item["price"])
+            grouped.setdefault(item["court"], []).append(item)
+        return grouped
+
+    # Le schedules sono in cache per (campo, data): una prenotazione invalida solo il suo campo
+    court_ids = _court_ids(sport, court_id)
+    parts = [booking_date, pricing.rules_version()] if booking_date else ["all"]
+    per_court = get_or_compute_per_court("schedules", court_ids, [*parts, *expand], compute, default=[])
+    rows = [item for pk in court_ids for item in per_court[pk]]
+    if booking_date and request.query_params.get("fields"):
+        # Il prezzo effettivo accompagna sempre le colonne scelte con ?fields=
+        return Response([{**selected.project(row), "effective_price": row["effective_price"]} for row in rows])
+    return Response(_project(selected, rows, request))
+
 
-    serializer = ScheduleSerializer(schedules, many=True)
-    return Response(serializer.data)
+@api_view(["GET"])
+def get_availability(request):
+    # Matrice di disponibilità per un intervallo di date (es: calendario di due settimane)
+    start = parse_query_date(request.query_params.get("start", ""))
+    end = parse_query_date(request.query_params.get("end", ""))
+    if start is None or end is None:
+        return _bad_request("Parametri start ed end obbligatori nel formato YYYY-MM-DD.")
+    if end < start or (end - start).days >= MAX_MATRIX_DAYS:
+        return _bad_request(f"L'intervallo deve essere compreso tra 1 e {MAX_MATRIX_DAYS} giorni.")
+
+    court_id, error = parse_court_id(request.query_params)
+    if error:
+        return _bad_request(error)
+
+    # La matrice è in cache per (campo, intervallo)
+    court_ids = _court_ids(request.query_params.get("sport", None), court_id)
+    matrix = get_or_compute_per_court(
+        "availability",
+        court_ids,
+        [start, end],
+        lambda missing: availability_matrix(start, end, court_ids=missing),
+    )
+    return Response(
+        {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "slots": SLOTS,
+            "courts": {pk: masks for pk, masks in matrix.items() if masks is not None},
+        }
+    )
 
 
 @api_view(["POST"])
@@ -98,21 +244,36 @@ def create_schedule(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+def create_schedules_bulk(request):
+    # Crea più orari in un'unica transazione (es: il listino completo di un nuovo campo)
+    result = services.create_schedules(request.data)
+    return Response(result.data, status=result.status)
+
+
+# Con ?expand=court il dettaglio contiene anche le colonne del campo
+def _schedule_detail_tables(request):
+    tables = ["schedules"]
+    if "court" in parse_query_list(request.GET.get("expand")):
+        tables.append("courts")
+    return tables
+
+
+@table_condition(_schedule_detail_tables)
 @api_view(["GET", "PUT", "DELETE"])
 def schedule_detail(request, pk):
     # Gestisce le operazioni di dettaglio per un singolo orario
+    # Recupera i dettagli di una schedule (con ?fields= ed ?expand=court)
+    if request.method == "GET":
+        return _detail(schedules_values, Schedule.objects.filter(pk=pk), request)
+
     try:
         schedule = Schedule.objects.get(pk=pk)  # Recupera una schedule specifica
     except Schedule.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    # Recupera i dettagli di una schedule
-    if request.method == "GET":
-        serializer = ScheduleSerializer(schedule)
-        return Response(serializer.data)
-
     # Aggiorna i dettagli di una schedule
-    elif request.method == "PUT":
+    if request.method == "PUT":
         serializer = ScheduleSerializer(schedule, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -121,7 +282,7 @@ def schedule_detail(request, pk):
 
     # Cancella una schedule
     elif request.method == "DELETE":
-        schedule.delete()
+        services.delete_schedule(schedule, archive=settings.ARCHIVE_DELETED_BOOKINGS)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -130,48 +291,140 @@ def schedule_detail(request, pk):
 
 @api_view(["GET"])
 def get_bookings(request):
-    # Recupera tutte le prenotazioni
-    bookings = Booking.objects.all()
-    serializer = BookingSerializer(bookings, many=True)
-    return Response(serializer.data)
+    # Recupera le prenotazioni una pagina alla volta (paginazione a cursore),
+    # filtrabili per intervallo di date, campo ed email.
+    bookings, error = filter_bookings(request.query_params)
+    if error:
+        return _bad_request(error)
+    selected, error = select_fields(bookings_values, request.query_params)
+    if error:
+        return _bad_request(error)
+
+    # Campo e orario (usati dal serializer) vengono letti nella stessa query con .values()
+    paginator = BookingKeysetPagination()
+    page = paginator.paginate_queryset(selected.values(bookings, extra=paginator.ordering), request)
+    return paginator.get_paginated_response([selected.to_representation(row) for row in page])
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, CSVRenderer, NDJSONRenderer])
+def export_bookings(request, export_format):
+    # Esporta le prenotazioni filtrate (date_from, date_to, court_id, email) in
+    # CSV o NDJSON, in streaming: riservato agli utenti autenticati (contabilità)
+    if export_format not in FORMATS:
+        return _bad_request("Formato non supportato, usare csv o ndjson.")
+    bookings, error = filter_bookings(request.query_params)
+    if error:
+        return _bad_request(error)
+    selected, error = select_fields(bookings_values, request.query_params)
+    if error:
+        return _bad_request(error)
+
+    return StreamingHttpResponse(
+        stream_bookings(export_format, selected, bookings),
+        content_type=FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="prenotazioni.{export_format}"'},
+    )
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny]) # Permette anche a chi non è autenticato di creare una prenotazione
+# Con il sistema sovraccarico risponde 503, oltre i limiti per IP/email 429
+@throttle_classes([LoadSheddingThrottle, BookingRateThrottle])
 def create_booking(request):
-    # Crea una nuova prenotazione
-    serializer = BookingSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    # Crea una nuova prenotazione: lo slot viene bloccato durante l'inserimento,
+    # un conflitto restituisce 409 e l'header Idempotency-Key evita doppi inserimenti
+    result = services.create_booking(
+        request.data, idempotency_key=request.headers.get("Idempotency-Key")
+    )
+    headers = {"Idempotent-Replayed": "true"} if result.replayed else None
+    return Response(result.data, status=result.status, headers=headers)
+
+
+@api_view(["POST"])
+def create_bookings_bulk(request):
+    # Crea più prenotazioni in un'unica transazione (es: slot settimanali ricorrenti)
+    result = services.create_bookings(request.data)
+    return Response(result.data, status=result.status)
 
 
 @api_view(["GET", "PUT", "DELETE"])
 def booking_detail(request, pk):
     # Gestisce le operazioni di dettaglio per una singola prenotazione
+    # Recupera i dettagli di una prenotazione (campo e orario nella stessa query);
+    # le prenotazioni archiviate si possono ancora leggere ma non modificare
+    if request.method == "GET":
+        response = _detail(bookings_values, Booking.objects.filter(pk=pk), request)
+        if response.status_code == status.HTTP_404_NOT_FOUND:
+            response = _detail(archive_values, BookingArchive.objects.filter(pk=pk), request)
+        return response
+
     try:
-        booking = Booking.objects.get(pk=pk)
+        booking = Booking.objects.select_related("schedule__court").get(pk=pk)
     except Booking.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    # Recupera i dettagli di una prenotazione
-    if request.method == "GET":
-        serializer = BookingSerializer(booking)
-        return Response(serializer.data)
-
     # Aggiorna i dettagli di una prenotazione
-    elif request.method == "PUT":
-        serializer = BookingSerializer(booking, data=request.data)
-        if serializer.is_valid():
-            try:
-                serializer.save()
-                return Response(serializer.data)
-            except ValidationError as e:
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if request.method == "PUT":
+        try:
+            result = services.update_booking(booking, request.data)
+        except ValidationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.data, status=result.status)
 
     # Cancella una prenotazione
     elif request.method == "DELETE":
         booking.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ********** REPORT **********
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_occupancy_report(request):
+    # Occupazione e incassi per campo o sport, raggruppati per giorno, settimana,
+    # mese o orario (es: ?start=2024-06-01&end=2024-06-30&group=week&by=sport)
+    params = request.query_params
+    start = parse_query_date(params.get("start", ""))
+    end = parse_query_date(params.get("end", ""))
+    if start is None or end is None:
+        return _bad_request("Parametri start ed end obbligatori nel formato YYYY-MM-DD.")
+    if end < start or (end - start).days >= MAX_REPORT_DAYS:
+        return _bad_request(f"L'intervallo deve essere compreso tra 1 e {MAX_REPORT_DAYS} giorni.")
+
+    group = params.get("group", "day")
+    by = params.get("by", "court")
+    if group not in GROUPS:
+        return _bad_request(f"group non valido, valori ammessi: {', '.join(GROUPS)}.")
+    if by not in DIMENSIONS:
+        return _bad_request(f"by non valido, valori ammessi: {', '.join(DIMENSIONS)}.")
+
+    court_id, error = parse_court_id(params)
+    if error:
+        return _bad_request(error)
+
+    report = occupancy_report(
+        start, end, group=group, by=by, court_id=court_id, sport=params.get("sport", None)
+    )
+    return Response(
+        {"start": start.isoformat(), "end": end.isoformat(), "group": group, "by": by, "results": report}
+    )
+
+
+# ********** METRICHE **********
+
+
+# Metriche del processo in formato Prometheus, con l'header
+# "Authorization: Bearer <PERF_METRICS_TOKEN>". Senza token configurato
+# l'endpoint non è esposto.
+@require_GET
+def metrics(request):
+    token = settings.PERF_METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
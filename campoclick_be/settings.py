@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -59,6 +60,23 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Strumentazione delle richieste (api/middleware.py): le richieste con più di
+# PERF_QUERY_BUDGET query vengono segnalate (0 disattiva il controllo);
+# PERF_METRICS_TOKEN protegge l'endpoint /api/metrics/ (senza token risponde 404)
+PERF_QUERY_BUDGET = int(os.getenv("PERF_QUERY_BUDGET", 20))
+PERF_METRICS_TOKEN = os.getenv("PERF_METRICS_TOKEN")
+
+# Limiti di create_booking (api/throttling.py): token bucket per IP e per email
+# nel formato "richieste/periodo" (s, min, h, d); un valore vuoto disattiva il limite
+BOOKING_RATE_LIMITS = {
+    "ip": os.getenv("BOOKING_RATE_IP", "30/min"),
+    "email": os.getenv("BOOKING_RATE_EMAIL", "10/min"),
+}
+# Load shedding: 503 + Retry-After oltre queste soglie (0 disattiva il controllo)
+LOAD_SHED_MAX_IN_FLIGHT = int(os.getenv("LOAD_SHED_MAX_IN_FLIGHT", 0))
+LOAD_SHED_DB_LATENCY = float(os.getenv("LOAD_SHED_DB_LATENCY", 0))  # secondi per query
+LOAD_SHED_RETRY_AFTER = int(os.getenv("LOAD_SHED_RETRY_AFTER", 5))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -69,7 +87,17 @@ REST_FRAMEWORK = {
     # Accesso read-only per utenti non autenticati
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly'
-    ]
+    ],
+    # Renderer JSON basato su orjson (stesso output di JSONRenderer)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'api.renderers.ColumnarJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Proxy fidati davanti all'applicazione: l'IP del client (limiti per IP) è
+    # l'indirizzo aggiunto a X-Forwarded-For dall'ultimo proxy. Con 0 si usa
+    # REMOTE_ADDR; l'header inviato dal client non viene mai usato da solo.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
 
 ROOT_URLCONF = 'campoclick_be.urls'
@@ -96,6 +124,17 @@ WSGI_APPLICATION = 'campoclick_be.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Gestione delle connessioni:
+# - DB_POOL=True abilita il pool di connessioni di psycopg 3 (psycopg_pool),
+#   dimensionato con DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE
+# - senza pool, DB_CONN_MAX_AGE > 0 mantiene le connessioni persistenti tra le richieste
+# - DB_CONN_HEALTH_CHECKS verifica la connessione prima di riusarla (anche dal pool)
+# - DB_TRANSACTION_POOLER=True rende le query compatibili con un pooler in modalità
+#   transazione (es: PgBouncer): niente cursori lato server. I prepared statement
+#   di psycopg 3 sono già disattivati da Django (prepare_threshold non impostato).
+DB_POOL = os.getenv("DB_POOL", "False") == "True"
+DB_TRANSACTION_POOLER = os.getenv("DB_TRANSACTION_POOLER", "False") == "True"
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -104,9 +143,98 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT"),
+        # Il pool di Django non ammette connessioni persistenti
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
+        "DISABLE_SERVER_SIDE_CURSORS": DB_TRANSACTION_POOLER,
+        "OPTIONS": {},
     }
 }
 
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 4)),
+        # Secondi di attesa massima per ottenere una connessione dal pool
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        # Le connessioni inattive oltre max_idle secondi vengono chiuse
+        "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", 300)),
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Di default usa la cache locale in memoria (LRU limitata da CACHE_MAX_ENTRIES).
+# In produzione serve un backend condiviso tra i processi, ad esempio
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache e CACHE_LOCATION=redis://...
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", "campoclick"),
+        "TIMEOUT": int(os.getenv("CACHE_TIMEOUT", 300)),
+    }
+}
+
+# MAX_ENTRIES si applica solo ai backend locali (locmem, file, database)
+if "redis" not in CACHE_BACKEND and "memcached" not in CACHE_BACKEND:
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10000)),
+    }
+
+# Una cache locale al processo (o all'istanza) non vede le invalidazioni fatte
+# dagli altri worker, che continuerebbero a servire disponibilità non aggiornata.
+# Con questi backend la cache dei dati e i GET condizionali restano spenti, salvo
+# con un solo processo (CACHE_SINGLE_PROCESS=True, di default con DEBUG: runserver).
+PROCESS_LOCAL_CACHE_BACKENDS = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+SHARED_CACHE = (
+    CACHE_BACKEND not in PROCESS_LOCAL_CACHE_BACKENDS
+    or os.getenv("CACHE_SINGLE_PROCESS", str(DEBUG)) == "True"
+)
+
+
+# Inventario precalcolato degli slot (api/inventory.py). Se attivo, le date
+# dell'orizzonte vengono lette dalla tabella SlotInventory, estesa ogni giorno
+# con "python manage.py extend_slot_inventory".
+
+SLOT_INVENTORY = os.getenv("SLOT_INVENTORY", "False") == "True"
+SLOT_INVENTORY_DAYS = int(os.getenv("SLOT_INVENTORY_DAYS", 90))
+
+# Riepilogo giornaliero per i report di occupazione (api/reports.py), ricalcolato
+# in modo incrementale; "python manage.py refresh_occupancy --rebuild" lo ricostruisce.
+
+OCCUPANCY_ROLLUP = os.getenv("OCCUPANCY_ROLLUP", "False") == "True"
+
+# Aggiornamenti della disponibilità in tempo reale (Server-Sent Events, solo via
+# ASGI): GET /api/async/schedules/live/?court_id=&date=. Con più processi ASGI
+# serve un backend condiviso: PUBSUB_BACKEND=api.pubsub.PostgresBroker.
+
+LIVE_UPDATES = os.getenv("LIVE_UPDATES", "False") == "True"
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "api.pubsub.LocalBroker")
+LIVE_HEARTBEAT = int(os.getenv("LIVE_HEARTBEAT", 15))  # secondi
+
+# Cancellando un campo o un orario le prenotazioni passate vengono spostate
+# nell'archivio (BookingArchive) invece di essere eliminate.
+
+ARCHIVE_DELETED_BOOKINGS = os.getenv("ARCHIVE_DELETED_BOOKINGS", "False") == "True"
+
+# Giorni di storico conservati nella tabella delle prenotazioni: le date più
+# vecchie vanno nell'archivio con "python manage.py archive_bookings" (es: ogni notte)
+# e non accettano nuove prenotazioni.
+
+BOOKING_RETENTION_DAYS = int(os.getenv("BOOKING_RETENTION_DAYS", 365))
+
+# Ore di validità di una Idempotency-Key: oltre, la chiave vale come nuova e
+# "python manage.py prune_idempotency_keys" (es: ogni notte) la elimina.
+
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
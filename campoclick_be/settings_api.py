@@ -0,0 +1,44 @@
+"""
+Profilo "solo API" per il deploy serverless (es: Vercel).
+
+Si attiva con DJANGO_SETTINGS_MODULE=campoclick_be.settings_api: eredita
+database, cache e opzioni da settings.py ma carica solo le app e i middleware
+necessari agli endpoint JSON, riducendo gli import a ogni avvio a freddo.
+L'admin, le sessioni, i messaggi, i file statici e l'API navigabile restano
+disponibili solo con il profilo completo.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+# auth e contenttypes servono ai permessi di DRF (utente anonimo e Basic auth)
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'corsheaders',
+    'rest_framework',
+    'api',
+]
+
+MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'campoclick_be.urls_api'
+
+# Nessun template: gli errori usano le pagine predefinite di Django
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    # Senza sessioni le scritture riservate allo staff usano HTTP Basic
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'api.renderers.ColumnarJSONRenderer',
+    ],
+}
@@ -0,0 +1,10 @@
+"""
+URL configuration for the API-only profile (campoclick_be.settings_api).
+
+Same routes as campoclick_be/urls.py without the Django admin.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+]